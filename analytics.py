@@ -0,0 +1,116 @@
+"""
+Bulk analytics on NumPy arrays, for ranges too large to aggregate row by row in Python.
+
+NumPy is optional, everything else in sFinance works without it. Amounts stay int64 cents, so
+sums and running balances are exact.
+"""
+from core import ALL_CATEGORIES, build_filter, rule_category, search_query
+from recurring import iter_occurrences
+from repository import get_connection
+
+try:
+    import numpy
+except ImportError:  # Analytics are optional
+    numpy = None
+
+CHUNK_SIZE = 50_000
+
+PERCENTILES = [50, 90, 99]
+
+
+def require_numpy():
+    if numpy is None:
+        raise ValueError("Analytics need NumPy, install it with 'pip install numpy'.")
+
+
+def load_columns(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None, chunk_size=CHUNK_SIZE):
+    """
+    Load date, category and amount of the expenses in a filter as column arrays, ordered by date.
+    Recurring occurrences in the range are included.
+
+    Returns a dict with "dates" (datetime64[D]), "categories" (int codes), "category_names" (code -> name)
+    and "amount_cents" (int64). Rows are read in chunks, so no list of all rows is built.
+    """
+    require_numpy()
+    conn = conn or get_connection()
+    where, params = build_filter(start_date, end_date, category)
+    if search and search.strip():
+        cursor = conn.execute(f"""SELECT date, category, amount_cents
+                                  FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+                                  {where} AND expenses_fts MATCH ? ORDER BY date""", params + [search_query(search)])
+    else:
+        cursor = conn.execute(f"SELECT date, category, amount_cents FROM expenses {where} ORDER BY date", params)
+
+    category_codes = {}
+    dates, categories, amounts = [], [], []
+
+    def add_chunk(rows):
+        day_column, category_column, amount_column = zip(*rows)
+        dates.append(numpy.array(day_column, dtype="datetime64[D]"))
+        categories.append(numpy.fromiter((category_codes.setdefault(name, len(category_codes))
+                                          for name in category_column), dtype=numpy.int64, count=len(rows)))
+        amounts.append(numpy.fromiter(amount_column, dtype=numpy.int64, count=len(rows)))
+
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            add_chunk(rows)
+    finally:
+        cursor.close()
+
+    recurring = [(day, row_category, amount_cents) for _, row_category, day, amount_cents, _
+                 in iter_occurrences(start_date, end_date, rule_category(category), search, conn)]
+    if recurring:
+        add_chunk(recurring)
+
+    columns = {
+        "dates": numpy.concatenate(dates) if dates else numpy.array([], dtype="datetime64[D]"),
+        "categories": numpy.concatenate(categories) if categories else numpy.array([], dtype=numpy.int64),
+        "category_names": list(category_codes),
+        "amount_cents": numpy.concatenate(amounts) if amounts else numpy.array([], dtype=numpy.int64),
+    }
+    if recurring:
+        # Put the occurrences in date order between the stored expenses
+        order = numpy.argsort(columns["dates"], kind="stable")
+        for name in ("dates", "categories", "amount_cents"):
+            columns[name] = columns[name][order]
+    return columns
+
+
+def group_sums(keys, amount_cents, group_count):
+    """Sum amount_cents per integer key in [0, group_count), exactly in int64."""
+    # bincount would sum in float64, add.at keeps the integer cents
+    sums = numpy.zeros(group_count, dtype=numpy.int64)
+    numpy.add.at(sums, keys, amount_cents)
+    return sums
+
+
+def category_totals(columns):
+    """Return (category, total cents, count) tuples, largest total first."""
+    names = columns["category_names"]
+    totals = group_sums(columns["categories"], columns["amount_cents"], len(names))
+    counts = numpy.bincount(columns["categories"], minlength=len(names))
+    order = numpy.argsort(-totals, kind="stable")
+    return [(names[i], int(totals[i]), int(counts[i])) for i in order]
+
+
+def monthly_totals(columns):
+    """Return (YYYY-MM, total cents) tuples in month order."""
+    months, keys = numpy.unique(columns["dates"].astype("datetime64[M]"), return_inverse=True)
+    totals = group_sums(keys, columns["amount_cents"], len(months))
+    return [(str(month), int(total)) for month, total in zip(months, totals)]
+
+
+def running_balance(columns):
+    """Return the cumulative spending in cents after each expense, in date order."""
+    return numpy.cumsum(columns["amount_cents"], dtype=numpy.int64)
+
+
+def amount_percentiles(columns, percentiles=PERCENTILES):
+    """Return {percentile: amount in cents} for the expense amounts, rounded to whole cents."""
+    if not len(columns["amount_cents"]):
+        return {}
+    values = numpy.percentile(columns["amount_cents"], percentiles)
+    return {percentile: int(round(value)) for percentile, value in zip(percentiles, values)}
@@ -0,0 +1,190 @@
+"""
+Online backups of the expense database with the SQLite backup API.
+
+The backup copies a batch of pages per step from a read snapshot and sleeps between steps, so the
+app keeps reading and writing while it runs. Finished backups are checked, then renamed into place, and only the newest
+ones are kept. A restore checks the backup's integrity before copying it over the live database.
+"""
+import datetime
+import itertools
+import os
+import sqlite3
+import time
+from repository import DB_PATH, bump_write_version, connect
+from schema import SCHEMA_VERSION, get_schema_version, migrate
+
+BACKUP_DIR = os.path.join('data', 'backups')
+BACKUP_PREFIX = "expenses-"
+SAFETY_PREFIX = "before-restore-"  # Copies made by restore_backup, not listed or rotated
+BACKUP_SUFFIX = ".db"
+BACKUP_INTERVAL = datetime.timedelta(days=1)  # For scheduled backups
+KEEP_BACKUPS = 7
+BACKUP_FILE_MODE = 0o600
+PAGES_PER_STEP = 256  # 1 MB per step with the default 4 KB pages
+STEP_PAUSE = 0.005  # Seconds between steps, lets other connections get the database lock
+
+
+class BackupError(Exception):
+    pass
+
+
+def reserve_backup_path(backup_dir, prefix=BACKUP_PREFIX):
+    """
+    Return the path for a new backup, named after the current time.
+
+    Its .part file is created exclusively, so two backups started at the same moment (e.g. by
+    another process) never write to the same file. Repeated names get a counter.
+    """
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    for attempt in itertools.count(1):
+        suffix = f"-{attempt}" if attempt > 1 else ""
+        path = os.path.join(backup_dir, f"{prefix}{stamp}{suffix}{BACKUP_SUFFIX}")
+        if os.path.exists(path):
+            continue
+        try:
+            # Owner only, the backups hold the whole ledger
+            os.close(os.open(path + ".part", os.O_CREAT | os.O_EXCL | os.O_WRONLY, BACKUP_FILE_MODE))
+        except FileExistsError:
+            continue
+        return path
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Return the paths of the finished backups, newest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir) if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def last_backup_time(backup_dir=BACKUP_DIR):
+    """Return when the newest backup was made, None if there is none."""
+    backups = list_backups(backup_dir)
+    if not backups:
+        return None
+    stamp = os.path.basename(backups[0])[len(BACKUP_PREFIX):]
+    try:
+        return datetime.datetime.strptime(stamp[:15], "%Y%m%d-%H%M%S")
+    except ValueError:
+        return None
+
+
+def backup_due(backup_dir=BACKUP_DIR, interval=BACKUP_INTERVAL):
+    """Whether a scheduled backup should run now."""
+    last = last_backup_time(backup_dir)
+    return last is None or datetime.datetime.now() - last >= interval
+
+
+def check_integrity(path):
+    """Raise BackupError unless path is an intact sFinance database this version can open."""
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            version = get_schema_version(conn)
+            has_expenses = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expenses'").fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise BackupError(f"{path} can't be read: {e}")
+
+    if result != ["ok"]:
+        raise BackupError(f"{path} is damaged: {'; '.join(result[:5])}")
+    # Any other SQLite file would pass the integrity check, and migrate() would turn it into an empty ledger
+    if version < 1 or not has_expenses:
+        raise BackupError(f"{path} is not an sFinance database")
+    if version > SCHEMA_VERSION:
+        raise BackupError(f"{path} was made by a newer version of sFinance (schema {version})")
+
+
+def copy_database(source, target, pages=PAGES_PER_STEP, progress=None):
+    """Copy source into target with the backup API, pages at a time, calling progress(remaining, total)."""
+    def on_step(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+        time.sleep(STEP_PAUSE)
+
+    source.backup(target, pages=pages, progress=on_step)
+
+
+def rotate_backups(backup_dir=BACKUP_DIR, keep=KEEP_BACKUPS):
+    """Delete all but the newest keep backups and return the deleted paths, keep None keeps all."""
+    if keep is None:
+        return []
+    removed = list_backups(backup_dir)[keep:]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_backup(db_path=DB_PATH, backup_dir=BACKUP_DIR, keep=KEEP_BACKUPS, pages=PAGES_PER_STEP, progress=None,
+                  prefix=BACKUP_PREFIX):
+    """
+    Back up the database while it stays in use and return the path of the new backup.
+
+    The copy is written to a .part file, checked and then renamed, so the backup directory only
+    ever contains complete backups. Older backups beyond keep are rotated out. Backups with another
+    prefix than BACKUP_PREFIX are neither listed nor rotated.
+    """
+    if not os.path.exists(db_path):
+        raise BackupError(f"There is no database at {db_path}")
+    if not os.path.isdir(backup_dir):
+        os.makedirs(backup_dir)
+
+    path = reserve_backup_path(backup_dir, prefix)
+    partial_path = path + ".part"
+    source = None
+    try:
+        # Own connections, so the backup doesn't hold the application connection
+        source = connect(db_path)
+        # A read transaction pins a WAL snapshot. Without it every commit of another connection
+        # between two steps would restart the backup from the first page.
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+        target = sqlite3.connect(partial_path)
+        try:
+            copy_database(source, target, pages, progress)
+            # The copy inherits WAL mode from the source, a backup should be a single self-contained file
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        check_integrity(partial_path)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        if source is not None:
+            source.close()
+
+    rotate_backups(backup_dir, keep)
+    return path
+
+
+def restore_backup(backup_path, db_path=DB_PATH, backup_dir=BACKUP_DIR):
+    """
+    Replace the database with a backup after checking the backup's integrity.
+
+    The current database is backed up first, with SAFETY_PREFIX, so the copy is kept outside the
+    rotation and doesn't count as a scheduled backup. The backup is then copied over the live
+    database with the backup API in a single step, which keeps the WAL consistent and is atomic for
+    other open connections, instead of swapping files underneath them. Returns the path of the
+    safety backup, None if there was no database yet.
+    """
+    check_integrity(backup_path)
+    safety_backup = (create_backup(db_path, backup_dir, keep=None, prefix=SAFETY_PREFIX)
+                     if os.path.exists(db_path) else None)
+
+    source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    target = connect(db_path)
+    try:
+        source.backup(target)
+        migrate(target)  # Backups from older versions get the current schema
+    finally:
+        source.close()
+        target.close()
+    bump_write_version()
+    return safety_backup
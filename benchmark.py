@@ -0,0 +1,235 @@
+"""
+Benchmarks for the insert, filter, aggregation and table paths on synthetic data.
+
+Usage: python benchmark.py [--sizes 10000 1000000 10000000] [--output results.json] [--compare previous.json]
+
+Every size gets its own scratch database in a temporary directory, filled by a seeded generator,
+so runs are comparable. Results are written as JSON.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from core import TIME_FILTERS, check_budget, date_range, expense_query, fetch_summary, build_filter
+from repository import INSERT_EXPENSE, INSERT_RECURRING_RULE, UPSERT_BUDGET, connect, find_duplicates
+from schema import migrate
+
+# Category -> (share of expenses, typical merchants, median amount)
+CATEGORIES = {
+    "Food": (0.40, ["Rewe", "Aldi", "Lidl", "Edeka", "Bakery", "Restaurant"], 25.0),
+    "Transport": (0.20, ["Deutsche Bahn", "Gas station", "Bus ticket", "Taxi"], 15.0),
+    "Entertainment": (0.12, ["Cinema", "Netflix", "Concert", "Books"], 20.0),
+    "Health": (0.08, ["Pharmacy", "Dentist", "Doctor"], 30.0),
+    "Utilities": (0.10, ["Electricity", "Internet", "Phone", "Water"], 60.0),
+    "Other": (0.10, ["Amazon", "Gift", "Clothing", "Hardware store"], 40.0),
+}
+
+DEFAULT_SIZES = [10_000]
+SINGLE_INSERTS = 200
+BATCH_SIZE = 10_000
+YEARS = 5
+
+
+def generate_expenses(count, seed=42, end_date=datetime.date(2024, 12, 31)):
+    """Yield count expense tuples with realistic category, date and amount distributions."""
+    rng = random.Random(seed)
+    names = list(CATEGORIES)
+    weights = [CATEGORIES[name][0] for name in names]
+    days = YEARS * 365
+
+    for _ in range(count):
+        category = rng.choices(names, weights)[0]
+        _, merchants, median = CATEGORIES[category]
+
+        # More spending towards the end of the range and on weekends
+        date = end_date - datetime.timedelta(days=int(days * (1 - rng.random() ** 0.8)))
+        if date.weekday() < 5 and rng.random() < 0.2:
+            date += datetime.timedelta(days=5 - date.weekday())
+            date = min(date, end_date)
+
+        amount_cents = round(rng.lognormvariate(0, 0.8) * median * 100)
+        comment = "" if rng.random() < 0.8 else f"Note {rng.randint(1, 1000)}"
+        yield (rng.choice(merchants), category, date.isoformat(), amount_cents, comment)
+
+
+def timed(function, *args):
+    """Run function and return (seconds, result)."""
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def fill_database(conn, count, seed):
+    """Bulk insert count expenses with executemany batches in one transaction, like the CSV importer."""
+    conn.execute("BEGIN")
+    batch = []
+    for expense in generate_expenses(count, seed):
+        batch.append(expense)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(INSERT_EXPENSE, batch)
+            batch = []
+    if batch:
+        conn.executemany(INSERT_EXPENSE, batch)
+    conn.commit()
+
+
+def bench_single_inserts(conn, seed):
+    """
+    Insert expenses one at a time with a commit each, with the same steps as add_expense:
+    duplicate check, insert and budget check (with a budget and a recurring rule in every category).
+    """
+    with conn:
+        for category, (_, merchants, median) in CATEGORIES.items():
+            conn.execute(UPSERT_BUDGET, (category, round(median * 100 * 30)))
+            conn.execute(INSERT_RECURRING_RULE, (merchants[0], category, round(median * 100), "", "month", 1,
+                                                 "2020-01-01", None))
+
+    expenses = list(generate_expenses(SINGLE_INSERTS, seed + 1))
+    start = time.perf_counter()
+    for description, category, date, amount_cents, comment in expenses:
+        find_duplicates(description, date, amount_cents, conn)
+        with conn:
+            conn.execute(INSERT_EXPENSE, (description, category, date, amount_cents, comment))
+        check_budget(category, date, conn)
+    elapsed = time.perf_counter() - start
+
+    # The filter benchmarks run without rules and budgets, like before
+    with conn:
+        conn.execute("DELETE FROM recurring_rules")
+        conn.execute("DELETE FROM budgets")
+    return elapsed / SINGLE_INSERTS
+
+
+def fetch_all(conn, query, params):
+    return len(conn.execute(query, params).fetchall())
+
+
+def fetch_first_chunk(conn, query, params, chunk_size=256):
+    return len(conn.execute(query, params).fetchmany(chunk_size))
+
+
+def raw_total(conn, start_date, end_date, category):
+    where, params = build_filter(start_date, end_date, category)
+    return conn.execute(f"SELECT SUM(amount_cents) FROM expenses {where}", params).fetchone()[0]
+
+
+def bench_filters(conn, results):
+    """Time every time filter mode: first chunk, full fetch, rollup summary and raw SUM."""
+    day = datetime.date(2024, 6, 14)
+    for time_filter in TIME_FILTERS:
+        start_date, end_date = date_range(time_filter, day, datetime.date(2022, 1, 1), datetime.date(2024, 12, 31))
+        for category in ["All Categories", "Food"]:
+            name = f"{time_filter.lower().replace(' ', '_')}_{'all' if category == 'All Categories' else 'food'}"
+            query, params = expense_query(start_date, end_date, category)
+
+            results[f"filter_{name}_first_chunk"], _ = timed(fetch_first_chunk, conn, query, params)
+            results[f"filter_{name}_fetch_all"], rows = timed(fetch_all, conn, query, params)
+            results[f"filter_{name}_rows"] = rows
+            results[f"summary_{name}_rollup"], _ = timed(fetch_summary, start_date, end_date, category, None, conn)
+            results[f"summary_{name}_raw_sum"], _ = timed(raw_total, conn, start_date, end_date, category)
+
+
+def bench_table(conn, results):
+    """Time the first screenful of the evaluation table under the offscreen Qt platform."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication, QTableView
+        from data import ExpenseTableModel
+    except ImportError:
+        return  # Qt is optional for the benchmarks
+
+    app = QApplication.instance() or QApplication([])
+    query, params = expense_query(*date_range("Custom Range", None, datetime.date(2000, 1, 1),
+                                              datetime.date(2030, 1, 1)))
+
+    start = time.perf_counter()
+    model = ExpenseTableModel()
+    view = QTableView()
+    view.setModel(model)
+    model.reset(None)
+    model.append_rows(conn.execute(query, params).fetchmany(256), False)
+    view.show()
+    app.processEvents()
+    results["table_first_screenful"] = time.perf_counter() - start
+    view.close()
+
+
+def run_size(count, seed, directory):
+    """Build a scratch database with count expenses and time all paths on it."""
+    path = os.path.join(directory, f"bench_{count}.db")
+    conn = connect(path)
+    migrate(conn)
+
+    results = {}
+    results["bulk_insert"], _ = timed(fill_database, conn, count, seed)
+    results["bulk_insert_rows_per_second"] = count / results["bulk_insert"]
+    results["single_insert_per_row"] = bench_single_inserts(conn, seed)
+    bench_filters(conn, results)
+    bench_table(conn, results)
+
+    conn.close()
+    os.remove(path)
+    return results
+
+
+def compare(results, previous, threshold):
+    """Print timings that got slower than threshold compared to a previous run."""
+    regressions = 0
+    for size, timings in results["sizes"].items():
+        for name, value in timings.items():
+            old = previous.get("sizes", {}).get(size, {}).get(name)
+            if not old or name.endswith("_rows") or name.endswith("_per_second"):
+                continue
+            ratio = value / old
+            if ratio > threshold:
+                regressions += 1
+                print(f"REGRESSION {size} {name}: {old * 1000:.2f} ms -> {value * 1000:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sFinance benchmarks on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Numbers of expenses to generate, e.g. 10000 1000000 10000000")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Slowdown factor reported as regression")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "sizes": {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.sizes:
+            print(f"Benchmarking {count} expenses...", file=sys.stderr)
+            results["sizes"][str(count)] = run_size(count, args.seed, directory)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        if compare(results, previous, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
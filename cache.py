@@ -0,0 +1,91 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value, limit=None):
+    """
+    Roughly estimate the memory used by a cached value of tuples, lists, dicts and scalars.
+
+    With a limit, the estimate stops as soon as it exceeds the limit and returns what it counted so far.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = (item for pair in value.items() for item in pair)
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return size
+    for item in items:
+        size += estimate_size(item, None if limit is None else limit - size)
+        if limit is not None and size > limit:
+            break
+    return size
+
+
+class QueryCache:
+    """
+    LRU cache for query results with a memory bound.
+
+    version_source returns a token that changes whenever the underlying data changes. All entries
+    are dropped as soon as the token differs from the one the entries were stored under.
+    """
+
+    def __init__(self, version_source, max_bytes=32 * 1024 * 1024):
+        self.version_source = version_source
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        """Return the current data version, clearing the cache if the data has changed."""
+        version = self.version_source()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+        return version
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        self.current_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, version):
+        """
+        Store a value computed from the data at the given version.
+
+        Values computed from outdated data and values larger than a quarter of the
+        memory bound are not stored.
+        """
+        size = estimate_size(value, self.max_entry_bytes)
+        if size > self.max_entry_bytes:
+            return
+
+        with self._lock:
+            if version != self._version:
+                return
+
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._size += size
+
+            # Evict the least recently used entries
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
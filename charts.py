@@ -0,0 +1,142 @@
+"""Trend chart for the evaluation window, drawn with QPainter from the bucketed totals of core.fetch_trend."""
+import datetime
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen
+from core import format_cents
+
+TREND_MODES = ["Total", "By Category"]
+
+SERIES_COLORS = ["#007AFF", "#FF9500", "#34C759", "#FF3B30", "#AF52DE", "#5AC8FA", "#FFCC00", "#8E8E93"]
+MAX_CATEGORY_SERIES = len(SERIES_COLORS) - 1  # Smaller categories are drawn together as one series
+# Not "Other", that is a category of its own (built in and the importer's default)
+REMAINING_SERIES = "Remaining categories"
+
+
+class TrendChart(QWidget):
+    """
+    Line chart of spending per time bucket, either in total or per category.
+
+    set_trend only regroups the (already bucketed) points into series when the data actually changed,
+    and paintEvent just maps the series to the current widget size.
+    """
+
+    MARGIN = 12
+    MARGIN_BOTTOM = 28
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(180)
+        self._trend = None
+        self._mode = TREND_MODES[0]
+        self._days = []  # Sorted bucket starts as date ordinals
+        self._series = []  # (name, color, [total cents per bucket])
+
+    def set_trend(self, trend):
+        """Show the result of core.fetch_trend, None clears the chart."""
+        if trend == self._trend:
+            return
+        self._trend = trend
+        self._build_series()
+        self.update()
+
+    def set_mode(self, mode):
+        if mode == self._mode:
+            return
+        self._mode = mode
+        self._build_series()
+        self.update()
+
+    def _build_series(self):
+        days = {}
+        for bucket in {bucket for bucket, _, _ in self._trend["points"]} if self._trend else ():
+            try:
+                days[bucket] = datetime.date.fromisoformat(bucket).toordinal()
+            except (TypeError, ValueError):
+                continue  # Not a date, e.g. from an expense stored before dates were validated
+        points = [point for point in self._trend["points"] if point[0] in days] if self._trend else []
+        buckets = sorted(days)
+        index = {bucket: i for i, bucket in enumerate(buckets)}
+        self._days = [days[bucket] for bucket in buckets]
+
+        totals = {}  # series name -> totals per bucket
+        if self._mode == "Total":
+            names = ["Total"]
+        else:
+            by_category = {}
+            for _, category, total_cents in points:
+                by_category[category] = by_category.get(category, 0) + total_cents
+            names = sorted(by_category, key=by_category.get, reverse=True)
+            if len(names) > MAX_CATEGORY_SERIES + 1:
+                names = names[:MAX_CATEGORY_SERIES] + [REMAINING_SERIES]
+        for name in names:
+            totals[name] = [0] * len(buckets)
+
+        for bucket, category, total_cents in points:
+            name = category if category in totals else names[-1]
+            totals[name][index[bucket]] += total_cents
+
+        self._series = [(name, QColor(SERIES_COLORS[i % len(SERIES_COLORS)]), totals[name])
+                        for i, name in enumerate(names)]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor(40, 40, 40))
+        text_color = QColor("white")
+        painter.setPen(text_color)
+
+        if not self._days:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No expenses")
+            return
+
+        top = max(max(values) for _, _, values in self._series) or 1
+        top_label = format_cents(top)
+        margin_left = painter.fontMetrics().horizontalAdvance(top_label) + self.MARGIN
+        plot = QRectF(margin_left, self.MARGIN, self.width() - margin_left - self.MARGIN,
+                      self.height() - self.MARGIN - self.MARGIN_BOTTOM)
+        first, last = self._days[0], self._days[-1]
+        span = (last - first) or 1
+
+        def point(day, cents):
+            x = plot.left() + (day - first) / span * plot.width() if last != first else plot.center().x()
+            return QPointF(x, plot.bottom() - cents / top * plot.height())
+
+        # Axes with the largest bucket total and the first/last bucket
+        painter.setPen(QPen(QColor(120, 120, 120)))
+        painter.drawLine(plot.bottomLeft(), plot.bottomRight())
+        painter.drawLine(plot.bottomLeft(), plot.topLeft())
+        painter.setPen(text_color)
+        painter.drawText(QRectF(0, plot.top() - 10, margin_left - 6, 20),
+                         Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, top_label)
+        painter.drawText(QRectF(0, plot.bottom() - 10, margin_left - 6, 20),
+                         Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, "0")
+        label_rect = QRectF(plot.left(), plot.bottom() + 4, plot.width(), self.MARGIN_BOTTOM - 4)
+        painter.drawText(label_rect, Qt.AlignmentFlag.AlignLeft,
+                         datetime.date.fromordinal(first).isoformat())
+        painter.drawText(label_rect, Qt.AlignmentFlag.AlignRight,
+                         f"{datetime.date.fromordinal(last).isoformat()} (per {self._trend['bucket']})")
+
+        for name, color, values in self._series:
+            path = QPainterPath(point(self._days[0], values[0]))
+            for day, cents in zip(self._days[1:], values[1:]):
+                path.lineTo(point(day, cents))
+            painter.setPen(QPen(color, 2))
+            painter.drawPath(path)
+            if len(self._days) == 1:
+                painter.setBrush(color)
+                painter.drawEllipse(point(self._days[0], values[0]), 3, 3)
+
+        # Legend in the top right corner
+        if len(self._series) > 1:
+            line_height = painter.fontMetrics().height()
+            width = max(painter.fontMetrics().horizontalAdvance(name) for name, _, _ in self._series) + 24
+            legend = QRectF(plot.right() - width, plot.top(), width, line_height * len(self._series))
+            painter.fillRect(legend, QColor(40, 40, 40, 200))
+            y = legend.top()
+            for name, color, _ in self._series:
+                painter.fillRect(QRectF(legend.left() + 4, y + line_height / 2 - 5, 10, 10), color)
+                painter.setPen(text_color)
+                painter.drawText(QRectF(legend.left() + 20, y, width - 20, line_height),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, name)
+                y += line_height
@@ -0,0 +1,289 @@
+"""Headless command line interface, run with "python -m sfinance <command>". Must not import Qt."""
+import argparse
+import datetime
+import sys
+from core import (AMOUNT_COLUMN, ALL_CATEGORIES, add_expense, add_recurring_expense, budget_report, budget_warning,
+                  date_range, fetch_summary, format_cents, iter_expenses, remove_duplicates, scan_duplicates,
+                  set_budget)
+from recurring import INTERVAL_UNITS, list_rules, materialize
+from repository import delete_budget, delete_recurring_rule
+from export import EXPORT_FORMATS, export_expenses, format_from_path
+
+
+def parse_date(text):
+    return datetime.date.fromisoformat(text)
+
+
+def add_filter_arguments(parser):
+    """Add the time and category filter options, mirroring the evaluation window."""
+    time_group = parser.add_mutually_exclusive_group()
+    time_group.add_argument("--day", type=parse_date, metavar="YYYY-MM-DD", help="Expenses of one day")
+    time_group.add_argument("--week", type=parse_date, metavar="YYYY-MM-DD", help="Expenses of the week containing the date")
+    time_group.add_argument("--month", metavar="YYYY-MM", help="Expenses of one month (default: current month)")
+    time_group.add_argument("--range", nargs=2, type=parse_date, metavar=("START", "END"),
+                            help="Expenses between two dates, both inclusive")
+    parser.add_argument("--category", default=ALL_CATEGORIES, help="Only expenses of this category")
+    parser.add_argument("--search", help="Only expenses whose description or comment match these words")
+
+
+def get_date_range(args):
+    """Turn the filter options into a [start, end) date range."""
+    if args.day:
+        return date_range("Day", args.day)
+    if args.week:
+        return date_range("Week", args.week)
+    if args.range:
+        return date_range("Custom Range", start_date=args.range[0], end_date=args.range[1])
+    month = parse_date(args.month + "-01") if args.month else None
+    return date_range("Month", month)
+
+
+def command_add(args):
+    budget_status = add_expense(args.description, args.category, args.date.isoformat(), args.amount, args.comment,
+                                args.allow_duplicate)
+    print("Expense added successfully!")
+    warning = budget_warning(budget_status)
+    if warning:
+        print(f"Warning: {warning}", file=sys.stderr)
+
+
+def command_query(args):
+    start_date, end_date = get_date_range(args)
+    for row in iter_expenses(start_date, end_date, args.category, args.search):
+        values = list(row)
+        values[AMOUNT_COLUMN] = format_cents(values[AMOUNT_COLUMN])
+        print("\t".join("" if value is None else str(value) for value in values))
+
+
+def command_summary(args):
+    start_date, end_date = get_date_range(args)
+    summary = fetch_summary(start_date, end_date, args.category, args.search)
+
+    print(f"Total Sum: {format_cents(summary['total_cents'])} €")
+    print(f"Expenses: {summary['count']}")
+    if summary["count"]:
+        print(f"Min: {format_cents(summary['min_cents'])} € | Max: {format_cents(summary['max_cents'])} €")
+    for category, total_cents, count in summary["by_category"]:
+        print(f"{category}: {format_cents(total_cents)} € ({count})")
+
+
+def command_dedup(args):
+    groups = scan_duplicates()
+    for fingerprint, ids in groups:
+        print(f"{fingerprint}\t{len(ids)}x\tids {', '.join(map(str, ids))}")
+    if args.delete:
+        print(f"Deleted {remove_duplicates(groups)} duplicate expenses.")
+    else:
+        print(f"{len(groups)} groups of duplicates, run with --delete to keep only the first of each.")
+
+
+def command_budget_set(args):
+    set_budget(args.category, args.limit)
+    print(f"Budget for {args.category} set.")
+
+
+def command_budget_remove(args):
+    delete_budget(args.category)
+    print(f"Budget for {args.category} removed.")
+
+
+def command_budget_report(args):
+    month = args.month or datetime.date.today().strftime("%Y-%m")
+    for category, limit_cents, spent_cents, remaining_cents in budget_report(month):
+        state = "over" if remaining_cents < 0 else "under"
+        print(f"{category}: {format_cents(spent_cents)} € of {format_cents(limit_cents)} € "
+              f"({format_cents(abs(remaining_cents))} € {state})")
+
+
+def command_recurring_add(args):
+    add_recurring_expense(args.description, args.category, args.start.isoformat(), args.amount, args.interval,
+                          args.every, args.end.isoformat() if args.end else None, args.comment)
+    print("Recurring expense added successfully!")
+
+
+def command_recurring_list(args):
+    for rule in list_rules():
+        every = f"every {rule.interval_count} {rule.interval_unit}s" if rule.interval_count > 1 else f"every {rule.interval_unit}"
+        until = f" until {rule.end_date}" if rule.end_date else ""
+        stored = f", stored before {rule.materialized_until}" if rule.materialized_until else ""
+        print(f"{rule.id}\t{rule.description}\t{rule.category}\t{format_cents(rule.amount_cents)} €\t"
+              f"{every} from {rule.start_date}{until}{stored}")
+
+
+def command_recurring_remove(args):
+    delete_recurring_rule(args.id)
+    print(f"Recurring expense {args.id} removed.")
+
+
+def command_recurring_materialize(args):
+    count = materialize(args.until.isoformat())
+    print(f"Stored {count} recurring expenses up to {args.until.isoformat()}.")
+
+
+def command_backup_create(args):
+    # Imported here like analytics, only the backup commands need it
+    import backup
+
+    def progress(remaining, total):
+        print(f"\r{total - remaining} / {total} pages copied", end="", file=sys.stderr)
+
+    try:
+        path = backup.create_backup(keep=args.keep, progress=progress)
+    except backup.BackupError as e:
+        raise ValueError(str(e))
+    print(f"\rBackup written to {path}", file=sys.stderr)
+
+
+def command_backup_list(args):
+    import backup
+
+    for path in backup.list_backups():
+        print(path)
+
+
+def command_backup_restore(args):
+    import backup
+
+    try:
+        safety_backup = backup.restore_backup(args.path)
+    except backup.BackupError as e:
+        raise ValueError(f"Not restored, {e}")
+    print(f"Restored {args.path}.")
+    if safety_backup:
+        print(f"The previous database was saved to {safety_backup}.")
+
+
+def command_analytics(args):
+    # Imported here, the other commands don't need NumPy
+    import analytics
+
+    start_date, end_date = get_date_range(args)
+    columns = analytics.load_columns(start_date, end_date, args.category, args.search)
+    if not len(columns["amount_cents"]):
+        print("No expenses.")
+        return
+
+    print(f"Total Sum: {format_cents(int(analytics.running_balance(columns)[-1]))} €")
+    print("Percentiles: " + " | ".join(f"p{percentile}: {format_cents(cents)} €"
+                                       for percentile, cents in analytics.amount_percentiles(columns).items()))
+    print("By category:")
+    for category, total_cents, count in analytics.category_totals(columns):
+        print(f"  {category}: {format_cents(total_cents)} € ({count})")
+    print("By month:")
+    for month, total_cents in analytics.monthly_totals(columns):
+        print(f"  {month}: {format_cents(total_cents)} €")
+
+
+def command_export(args):
+    start_date, end_date = get_date_range(args)
+    fmt = args.format or (format_from_path(args.output) if args.output else "csv")
+
+    def progress(count):
+        print(f"\r{count} rows exported", end="", file=sys.stderr)
+
+    count = export_expenses(args.output or sys.stdout, fmt, start_date, end_date, args.category, args.search,
+                            progress=progress if args.output else None)
+    if args.output:
+        print(f"\rExported {count} expenses to {args.output}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m sfinance", description="sFinance command line interface")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Add an expense")
+    add_parser.add_argument("description")
+    add_parser.add_argument("amount", help="Amount, with , or . as decimal separator")
+    add_parser.add_argument("--category", default="Other")
+    add_parser.add_argument("--date", type=parse_date, default=datetime.date.today(), metavar="YYYY-MM-DD")
+    add_parser.add_argument("--comment", default="")
+    add_parser.add_argument("--allow-duplicate", action="store_true",
+                            help="Add the expense even if one with the same date, amount and description exists")
+    add_parser.set_defaults(func=command_add)
+
+    query_parser = subparsers.add_parser("query", help="Print the matching expenses, tab separated")
+    add_filter_arguments(query_parser)
+    query_parser.set_defaults(func=command_query)
+
+    summary_parser = subparsers.add_parser("summary", help="Print totals for the matching expenses")
+    add_filter_arguments(summary_parser)
+    summary_parser.set_defaults(func=command_summary)
+
+    dedup_parser = subparsers.add_parser("dedup", help="Find expenses with the same date, amount and description")
+    dedup_parser.add_argument("--delete", action="store_true", help="Delete all but the first of each group")
+    dedup_parser.set_defaults(func=command_dedup)
+
+    budget_parser = subparsers.add_parser("budget", help="Set, remove or report monthly category budgets")
+    budget_subparsers = budget_parser.add_subparsers(dest="budget_command", required=True)
+    budget_set_parser = budget_subparsers.add_parser("set", help="Set the monthly budget of a category")
+    budget_set_parser.add_argument("category")
+    budget_set_parser.add_argument("limit", help="Monthly limit, with , or . as decimal separator")
+    budget_set_parser.set_defaults(func=command_budget_set)
+    budget_remove_parser = budget_subparsers.add_parser("remove", help="Remove the budget of a category")
+    budget_remove_parser.add_argument("category")
+    budget_remove_parser.set_defaults(func=command_budget_remove)
+    budget_report_parser = budget_subparsers.add_parser("report", help="Print spending against every budget")
+    budget_report_parser.add_argument("--month", metavar="YYYY-MM", help="Month to report (default: current month)")
+    budget_report_parser.set_defaults(func=command_budget_report)
+
+    recurring_parser = subparsers.add_parser("recurring", help="Manage recurring expenses")
+    recurring_subparsers = recurring_parser.add_subparsers(dest="recurring_command", required=True)
+    recurring_add_parser = recurring_subparsers.add_parser("add", help="Add a recurring expense")
+    recurring_add_parser.add_argument("description")
+    recurring_add_parser.add_argument("amount", help="Amount, with , or . as decimal separator")
+    recurring_add_parser.add_argument("--interval", choices=INTERVAL_UNITS, default="month")
+    recurring_add_parser.add_argument("--every", type=int, default=1, help="Repeat every N intervals (default: 1)")
+    recurring_add_parser.add_argument("--category", default="Other")
+    recurring_add_parser.add_argument("--start", type=parse_date, default=datetime.date.today(), metavar="YYYY-MM-DD")
+    recurring_add_parser.add_argument("--end", type=parse_date, metavar="YYYY-MM-DD", help="Last possible occurrence")
+    recurring_add_parser.add_argument("--comment", default="")
+    recurring_add_parser.set_defaults(func=command_recurring_add)
+    recurring_list_parser = recurring_subparsers.add_parser("list", help="Print all recurring expenses")
+    recurring_list_parser.set_defaults(func=command_recurring_list)
+    recurring_remove_parser = recurring_subparsers.add_parser("remove", help="Remove a recurring expense")
+    recurring_remove_parser.add_argument("id", type=int)
+    recurring_remove_parser.set_defaults(func=command_recurring_remove)
+    recurring_materialize_parser = recurring_subparsers.add_parser(
+        "materialize", help="Store the occurrences up to a date as regular expenses")
+    recurring_materialize_parser.add_argument("--until", type=parse_date, default=datetime.date.today(),
+                                              metavar="YYYY-MM-DD", help="Last day to store (default: today)")
+    recurring_materialize_parser.set_defaults(func=command_recurring_materialize)
+
+    backup_parser = subparsers.add_parser("backup", help="Back up or restore the database")
+    backup_subparsers = backup_parser.add_subparsers(dest="backup_command", required=True)
+    backup_create_parser = backup_subparsers.add_parser("create", help="Back up the database, also while the app runs")
+    backup_create_parser.add_argument("--keep", type=int, default=7, help="Number of backups to keep (default: 7)")
+    backup_create_parser.set_defaults(func=command_backup_create)
+    backup_list_parser = backup_subparsers.add_parser("list", help="Print the backups, newest first")
+    backup_list_parser.set_defaults(func=command_backup_list)
+    backup_restore_parser = backup_subparsers.add_parser(
+        "restore", help="Replace the database with a backup after checking its integrity")
+    backup_restore_parser.add_argument("path")
+    backup_restore_parser.set_defaults(func=command_backup_restore)
+
+    analytics_parser = subparsers.add_parser("analytics", help="Print category, month and percentile statistics (needs NumPy)")
+    add_filter_arguments(analytics_parser)
+    analytics_parser.set_defaults(func=command_analytics)
+
+    export_parser = subparsers.add_parser("export", help="Export the matching expenses")
+    add_filter_arguments(export_parser)
+    export_parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    export_parser.add_argument("--format", "-f", choices=EXPORT_FORMATS,
+                               help="Export format (default: from the output file extension, else csv)")
+    export_parser.set_defaults(func=command_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
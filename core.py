@@ -0,0 +1,480 @@
+"""Query and insert logic shared by the GUI and the command line. Must not import Qt."""
+import datetime
+import decimal
+import heapq
+import itertools
+import sqlite3
+from repository import (SELECT_BUDGET_STATUS, delete_expenses, find_duplicates, get_connection, insert_expense,
+                        insert_recurring_rule, upsert_budget)
+from recurring import INTERVAL_UNITS, iter_occurrences
+
+ALL_CATEGORIES = "All Categories"
+
+TIME_FILTERS = ["Day", "Week", "Month", "Custom Range"]
+
+EXPENSE_COLUMNS = ["description", "category", "date", "amount_cents", "comment"]
+AMOUNT_COLUMN = EXPENSE_COLUMNS.index("amount_cents")
+DATE_COLUMN = EXPENSE_COLUMNS.index("date")
+
+# Trend bucket -> SQL expression for the first day of the bucket containing a YYYY-MM-DD column
+TREND_BUCKETS = {
+    "day": "{column}",
+    "week": "date({column}, 'weekday 0', '-6 days')",  # Monday, like date_range
+    "month": "substr({column}, 1, 7) || '-01'",
+    "year": "substr({column}, 1, 4) || '-01-01'",
+}
+MAX_TREND_POINTS = 120
+
+# 10 billion €, sums of millions of expenses still fit into SQLite's 64 bit integers
+MAX_AMOUNT_CENTS = 10 ** 12
+
+
+class DuplicateExpenseError(ValueError):
+    """Raised by add_expense for an expense with the same date, amount and description as a stored one."""
+
+
+def date_range(time_filter, day=None, start_date=None, end_date=None):
+    """
+    Return the [start, end) range for a time filter as YYYY-MM-DD strings.
+
+    Day, Week and Month use day (a datetime.date, default today), Custom Range
+    uses start_date and end_date, both inclusive.
+    """
+    day = day or datetime.date.today()
+    if time_filter == "Day":
+        start = day
+        end = start + datetime.timedelta(days=1)
+    elif time_filter == "Week":
+        # Weeks start on Monday, like strftime('%W')
+        start = day - datetime.timedelta(days=day.weekday())
+        end = start + datetime.timedelta(days=7)
+    elif time_filter == "Month":
+        start = day.replace(day=1)
+        end = datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    elif time_filter == "Custom Range":
+        start = start_date
+        end = end_date + datetime.timedelta(days=1)
+    else:
+        raise ValueError(f"Unknown time filter '{time_filter}'")
+
+    return start.isoformat(), end.isoformat()
+
+
+def build_filter(start_date, end_date, category=ALL_CATEGORIES):
+    """Build the WHERE clause and parameters for a [start_date, end_date) range and optional category."""
+    # Half-open ranges so the date index can be used
+    where = "WHERE date >= ? AND date < ?"
+    params = [start_date, end_date]
+
+    # Filter by category (only if a specific category is selected)
+    if category and category != ALL_CATEGORIES:
+        where += " AND category = ?"
+        params.append(category)
+
+    return where, params
+
+
+def rule_category(category):
+    """Category argument for the recurring rule functions, which take None for all categories."""
+    return None if category == ALL_CATEGORIES else category
+
+
+def search_query(text):
+    """
+    Turn free text typed by the user into an FTS5 query.
+
+    Every word must match, the words are quoted so FTS5 syntax characters can't cause errors,
+    and each word also matches as a prefix ("dent" finds "Dentist").
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def expense_query(start_date, end_date, category=ALL_CATEGORIES, search=None):
+    """
+    Return the SELECT statement and parameters for the expenses matching a filter.
+
+    Without search text the expenses are ordered by date, with search text by relevance.
+    """
+    where, params = build_filter(start_date, end_date, category)
+    if not search or not search.strip():
+        return f"SELECT {', '.join(EXPENSE_COLUMNS)} FROM expenses {where} ORDER BY date", params
+
+    columns = ", ".join(f"expenses.{column}" for column in EXPENSE_COLUMNS)
+    return (f"""SELECT {columns} FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+                {where} AND expenses_fts MATCH ? ORDER BY rank""", params + [search_query(search)])
+
+
+def fetch_summary(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None):
+    """
+    Return total, count, min/max and per-category totals in cents for the filter.
+
+    Plain filters are answered from the rollup tables, searches aggregate the matching rows.
+    Occurrences of recurring expenses in the range are added on top.
+    """
+    if search and search.strip():
+        where, params = build_filter(start_date, end_date, category)
+        query = f"""SELECT category, SUM(amount_cents), COUNT(*), MIN(amount_cents), MAX(amount_cents)
+                    FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+                    {where} AND expenses_fts MATCH ?
+                    GROUP BY category ORDER BY SUM(amount_cents) DESC"""
+        params.append(search_query(search))
+    else:
+        if start_date.endswith("-01") and end_date.endswith("-01"):
+            # Whole months can be answered from the monthly buckets
+            table, key, start, end = "expense_monthly_totals", "month", start_date[:7], end_date[:7]
+        else:
+            table, key, start, end = "expense_daily_totals", "day", start_date, end_date
+
+        query = f"""SELECT category, SUM(total_cents), SUM(count), MIN(min_cents), MAX(max_cents)
+                    FROM {table} WHERE {key} >= ? AND {key} < ?"""
+        params = [start, end]
+        if category and category != ALL_CATEGORIES:
+            query += " AND category = ?"
+            params.append(category)
+        query += " GROUP BY category ORDER BY SUM(total_cents) DESC"
+
+    conn = conn or get_connection()
+    totals = {row[0]: list(row[1:]) for row in conn.execute(query, params)}  # category -> [total, count, min, max]
+    for _, row_category, _, amount_cents, _ in iter_occurrences(start_date, end_date, rule_category(category),
+                                                                search, conn):
+        entry = totals.get(row_category)
+        if entry is None:
+            totals[row_category] = [amount_cents, 1, amount_cents, amount_cents]
+        else:
+            entry[0] += amount_cents
+            entry[1] += 1
+            entry[2] = min(entry[2], amount_cents)
+            entry[3] = max(entry[3], amount_cents)
+    by_category = sorted(((name,) + tuple(entry) for name, entry in totals.items()), key=lambda row: -row[1])
+
+    return {
+        "total_cents": sum(row[1] for row in by_category),
+        "count": sum(row[2] for row in by_category),
+        "min_cents": min((row[3] for row in by_category), default=None),
+        "max_cents": max((row[4] for row in by_category), default=None),
+        "by_category": [(row[0], row[1], row[2]) for row in by_category],
+    }
+
+
+def valid_date(column):
+    """
+    SQL condition that a column holds a real YYYY-MM-DD date.
+
+    Dates stored before they were validated (e.g. 2024-3-15) would end up in buckets that are no dates.
+    """
+    return f"date({column}) = {column}"
+
+
+def trend_bucket(start_date, end_date, max_points=MAX_TREND_POINTS):
+    """Return the smallest bucket that keeps a [start_date, end_date) range at max_points points or less."""
+    days = (datetime.date.fromisoformat(end_date) - datetime.date.fromisoformat(start_date)).days
+    if days <= max_points:
+        return "day"
+    if days <= max_points * 7:
+        return "week"
+    if days <= max_points * 30:
+        return "month"
+    return "year"
+
+
+def bucket_start(date, bucket):
+    """Python version of TREND_BUCKETS: the first day of the bucket containing a YYYY-MM-DD date."""
+    if bucket == "day":
+        return date
+    if bucket == "week":
+        day = datetime.date.fromisoformat(date)
+        return (day - datetime.timedelta(days=day.weekday())).isoformat()
+    if bucket == "month":
+        return date[:7] + "-01"
+    return date[:4] + "-01-01"
+
+
+def fetch_trend(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None, bucket=None):
+    """
+    Return spending over time for the filter, summed per time bucket and category in SQL.
+
+    The bucket (day, week, month or year) is picked from the length of the range unless given, so the
+    number of points stays bounded. Returns {"bucket": bucket, "points": [(bucket start, category, total cents)]}
+    ordered by bucket start.
+    """
+    bucket = bucket or trend_bucket(start_date, end_date)
+
+    if search and search.strip():
+        where, params = build_filter(start_date, end_date, category)
+        key = TREND_BUCKETS[bucket].format(column="expenses.date")
+        query = f"""SELECT {key} AS bucket, category, SUM(amount_cents)
+                    FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+                    {where} AND {valid_date("expenses.date")} AND expenses_fts MATCH ?"""
+        params.append(search_query(search))
+    else:
+        if bucket in ("month", "year") and start_date.endswith("-01") and end_date.endswith("-01"):
+            # Whole months can be answered from the monthly buckets
+            table, column, start, end = "expense_monthly_totals", "month || '-01'", start_date[:7], end_date[:7]
+            where = f"WHERE month >= ? AND month < ? AND {valid_date(column)}"
+        else:
+            table, column, start, end = "expense_daily_totals", "day", start_date, end_date
+            where = f"WHERE day >= ? AND day < ? AND {valid_date(column)}"
+        key = TREND_BUCKETS[bucket].format(column=column)
+        query = f"SELECT {key} AS bucket, category, SUM(total_cents) FROM {table} {where}"
+        params = [start, end]
+        if category and category != ALL_CATEGORIES:
+            query += " AND category = ?"
+            params.append(category)
+
+    query += " GROUP BY bucket, category"
+    conn = conn or get_connection()
+    totals = {(row[0], row[1]): row[2] for row in conn.execute(query, params)}
+
+    # Recurring occurrences go into the same buckets
+    for _, row_category, date, amount_cents, _ in iter_occurrences(start_date, end_date, rule_category(category),
+                                                                   search, conn):
+        key = (bucket_start(date, bucket), row_category)
+        totals[key] = totals.get(key, 0) + amount_cents
+
+    return {"bucket": bucket, "points": sorted(key + (total,) for key, total in totals.items())}
+
+
+def iter_stored_pages(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None, page_size=1000):
+    """
+    Yield the stored expenses matching a filter as lists of up to page_size rows, ordered like expense_query.
+
+    Every page is a statement of its own that is read completely, so a reader that pauses between
+    pages doesn't keep a statement open and pin a WAL read snapshot. Plain filters continue after
+    the last row's index key, searches (ranked, usually few rows) with an offset.
+    """
+    conn = conn or get_connection()
+    if search and search.strip():
+        query, params = expense_query(start_date, end_date, category, search)
+        offset = 0
+        while True:
+            rows = conn.execute(query + " LIMIT ? OFFSET ?", params + [page_size, offset]).fetchall()
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            offset += len(rows)
+
+    # The order of idx_expenses_category_date or idx_expenses_date_category, both end with the rowid
+    if category and category != ALL_CATEGORIES:
+        keys, where, params = "date, id", "WHERE category = ? AND date < ?", [category, end_date]
+    else:
+        keys, where, params = "date, category, id", "WHERE date < ?", [end_date]
+    key_count = keys.count(",") + 1
+    columns = ", ".join(EXPENSE_COLUMNS)
+    after = ()
+    while True:
+        # The key of the last row replaces the start date as lower bound, so each page starts with an index seek
+        if after:
+            bound, bound_params = f"({keys}) > ({', '.join('?' * key_count)})", list(after)
+        else:
+            bound, bound_params = "date >= ?", [start_date]
+        rows = conn.execute(f"SELECT {columns}, {keys} FROM expenses {where} AND {bound} ORDER BY {keys} LIMIT ?",
+                            params + bound_params + [page_size]).fetchall()
+        if rows:
+            yield [row[:-key_count] for row in rows]
+        if len(rows) < page_size:
+            return
+        after = rows[-1][-key_count:]
+
+
+def iter_expense_chunks(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None, chunk_size=1000):
+    """
+    Yield the expenses matching a filter as lists of up to chunk_size rows, read page by page.
+
+    Recurring occurrences are merged in by date, or follow the ranked rows when searching.
+    """
+    conn = conn or get_connection()
+    stored = itertools.chain.from_iterable(iter_stored_pages(start_date, end_date, category, search, conn, chunk_size))
+    recurring = iter_occurrences(start_date, end_date, rule_category(category), search, conn)
+    if search and search.strip():
+        rows = itertools.chain(stored, recurring)
+    else:
+        rows = heapq.merge(stored, recurring, key=lambda row: row[DATE_COLUMN])
+
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_expenses(start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None, chunk_size=1000):
+    """Yield the expenses matching a filter, reading them from SQLite in chunks."""
+    for rows in iter_expense_chunks(start_date, end_date, category, search, conn, chunk_size):
+        yield from rows
+
+
+def parse_amount(text):
+    """Parse an amount as typed by the user into integer cents, without going through float."""
+    # Replace comma with a dot to handle both , and . as decimal separators
+    try:
+        amount = decimal.Decimal(text.strip().replace(',', '.'))
+    except decimal.InvalidOperation:
+        raise ValueError(f"invalid amount '{text}'")
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount '{text}'")
+
+    try:
+        cents = int((amount * 100).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP))
+    except decimal.InvalidOperation:  # More digits than the decimal context's precision
+        raise ValueError(f"invalid amount '{text}'")
+    if abs(cents) > MAX_AMOUNT_CENTS:
+        raise ValueError(f"invalid amount '{text}'")
+    return cents
+
+
+def format_cents(cents):
+    """Format integer cents as a decimal amount, e.g. -1250 -> '-12.50'."""
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def cents_to_decimal(cents):
+    """Return integer cents as an exact Decimal amount."""
+    return decimal.Decimal(cents).scaleb(-2)
+
+
+def to_cents(amount, message="Please enter a valid amount."):
+    """Return amount, the text typed by the user or integer cents, in cents. Raises ValueError(message) if invalid."""
+    if isinstance(amount, str):
+        try:
+            return parse_amount(amount)
+        except ValueError:
+            raise ValueError(message)
+    if isinstance(amount, int) and abs(amount) <= MAX_AMOUNT_CENTS:
+        return amount
+    raise ValueError(message)
+
+
+def add_expense(description, category, date, amount, comment="", allow_duplicate=False):
+    """
+    Validate and store a single expense.
+
+    amount is either the text typed by the user or integer cents. Raises ValueError with a
+    message for the user if the input is invalid, DuplicateExpenseError unless allow_duplicate
+    if the same expense is already stored. Returns the budget status of the category after the
+    insert (see check_budget), None if it has no budget or it could not be checked.
+    """
+    if not description or amount in (None, ""):
+        raise ValueError("Please fill out all fields.")
+
+    amount_cents = to_cents(amount)
+
+    # The rollups, fingerprints and trend buckets all rely on ISO dates
+    try:
+        date = datetime.date.fromisoformat(date).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError("Please enter a valid date (YYYY-MM-DD).")
+
+    if not allow_duplicate and find_duplicates(description, date, amount_cents)[1]:
+        raise DuplicateExpenseError("An expense with the same date, amount and description was already added.")
+
+    insert_expense(description, category, date, amount_cents, comment)
+    # The expense is stored at this point, a failing budget check must not look like a failed insert
+    try:
+        return check_budget(category, date)
+    except (ValueError, sqlite3.Error):
+        return None
+
+
+def check_budget(category, date, conn=None):
+    """
+    Return the budget status of category in the month of date, None if it has no budget.
+
+    The status is a dict with category, month, limit_cents, spent_cents and over.
+    """
+    conn = conn or get_connection()
+    month = date[:7]
+    row = conn.execute(SELECT_BUDGET_STATUS + " WHERE budgets.category = ?", (month, category)).fetchone()
+    if row is None:
+        return None
+    _, limit_cents, spent_cents = row
+    spent_cents += recurring_month_totals(month, category, conn).get(category, 0)
+    return {"category": category, "month": month, "limit_cents": limit_cents, "spent_cents": spent_cents,
+            "over": spent_cents > limit_cents}
+
+
+def budget_warning(status):
+    """Return the message for a budget status that is over its limit, None otherwise."""
+    if not status or not status["over"]:
+        return None
+    return (f"{status['category']} is over its budget for {status['month']}: "
+            f"{format_cents(status['spent_cents'])} € of {format_cents(status['limit_cents'])} € spent.")
+
+
+def recurring_month_totals(month, category=None, conn=None):
+    """Return {category: cents} of the recurring occurrences that are not stored yet in a YYYY-MM month."""
+    totals = {}
+    start_date, end_date = date_range("Month", datetime.date.fromisoformat(month + "-01"))
+    for _, row_category, _, amount_cents, _ in iter_occurrences(start_date, end_date, category, conn=conn):
+        totals[row_category] = totals.get(row_category, 0) + amount_cents
+    return totals
+
+
+def budget_report(month, conn=None):
+    """Return (category, limit cents, spent cents, remaining cents) for every budget in a YYYY-MM month."""
+    conn = conn or get_connection()
+    recurring = recurring_month_totals(month, conn=conn)
+    rows = conn.execute(SELECT_BUDGET_STATUS + " ORDER BY budgets.category", (month,)).fetchall()
+    return [(category, limit_cents, spent_cents + recurring.get(category, 0),
+             limit_cents - spent_cents - recurring.get(category, 0))
+            for category, limit_cents, spent_cents in rows]
+
+
+def set_budget(category, limit):
+    """Validate and store the monthly budget of a category, limit is text typed by the user or integer cents."""
+    if not category or limit in (None, ""):
+        raise ValueError("Please fill out all fields.")
+
+    limit = to_cents(limit, "Please enter a valid budget.")
+    if limit < 0:
+        raise ValueError("Please enter a valid budget.")
+
+    upsert_budget(category, limit)
+
+
+def scan_duplicates(conn=None):
+    """
+    Return (fingerprint, ids) for every group of expenses with the same fingerprint, ids ascending.
+
+    A single pass over the fingerprint index, the table itself is not read.
+    """
+    rows = (conn or get_connection()).execute(
+        "SELECT fingerprint, group_concat(id) FROM expenses GROUP BY fingerprint HAVING COUNT(*) > 1")
+    return [(fingerprint, sorted(int(expense_id) for expense_id in ids.split(","))) for fingerprint, ids in rows]
+
+
+def remove_duplicates(groups):
+    """Delete all but the first (oldest) expense of each duplicate group, return the number deleted."""
+    ids = [expense_id for _, group_ids in groups for expense_id in group_ids[1:]]
+    delete_expenses(ids)
+    return len(ids)
+
+
+def add_recurring_expense(description, category, start_date, amount, interval_unit, interval_count=1, end_date=None,
+                          comment=""):
+    """
+    Validate and store a recurring expense rule, starting on start_date and repeating every
+    interval_count days, weeks, months or years until end_date (inclusive, None for no end).
+
+    amount is either the text typed by the user or integer cents. Raises ValueError with a
+    message for the user if the input is invalid.
+    """
+    if not description or amount in (None, "") or not start_date:
+        raise ValueError("Please fill out all fields.")
+
+    amount = to_cents(amount)
+
+    try:
+        start = datetime.date.fromisoformat(start_date)
+        end = datetime.date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise ValueError("Please enter valid dates (YYYY-MM-DD).")
+    if end is not None and end < start:
+        raise ValueError("The end date must not be before the start date.")
+    if interval_unit not in INTERVAL_UNITS or interval_count < 1:
+        raise ValueError("Please choose a valid interval.")
+
+    insert_recurring_rule(description, category, amount, comment, interval_unit, interval_count,
+                          start.isoformat(), end.isoformat() if end else None)
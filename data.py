@@ -1,14 +1,23 @@
 import os
 import sys
-import sqlite3
+import time
+import queue
+import threading
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QPushButton, QComboBox, QDateEdit, 
-                             QTableWidget, QTableWidgetItem, QApplication)
-from PyQt6.QtCore import QDate
+                             QLineEdit, QTableView, QTableWidget, QTableWidgetItem, QDialog, QProgressBar, QProgressDialog,
+                             QFileDialog, QMessageBox,
+                             QApplication)
+from PyQt6.QtCore import QDate, Qt, QAbstractTableModel, QModelIndex, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QPalette, QColor, QIcon
-
-# Database connection
-conn = sqlite3.connect('data/expenses.db')
-cursor = conn.cursor()
+from styles import APP_STYLESHEET
+from repository import connect, delete_budget, fetch_categories, get_data_version
+from cache import QueryCache
+from core import (AMOUNT_COLUMN, ALL_CATEGORIES, EXPENSE_COLUMNS, TIME_FILTERS, budget_report, date_range,
+                  fetch_summary, fetch_trend, format_cents, iter_expense_chunks, set_budget)
+from charts import TREND_MODES, TrendChart
+from export import EXPORT_FORMATS, export_expenses, format_from_path
+from workers import Worker, WorkerSignals
+import instrumentation
 
 # Funktion, um den Pfad zu Ressourcen zu finden, unabhängig davon, ob das Programm als Skript oder EXE ausgeführt wird
 def resource_path(relative_path):
@@ -21,14 +30,311 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+# Results of recently used filters, dropped whenever the expenses change
+query_cache = QueryCache(get_data_version)
+# A row takes at least a tuple of its columns and a list slot, row counts above the cache's entry limit are not sized
+MIN_ROW_BYTES = sys.getsizeof((None,) * len(EXPENSE_COLUMNS)) + 8
+
+class QueryWorkerSignals(WorkerSignals):
+    """Signals of a QueryWorker, the results are tagged with the generation of the query that produced them."""
+    summary_ready = pyqtSignal(int, dict)
+    trend_ready = pyqtSignal(int, dict)
+    rows_ready = pyqtSignal(int, list, bool)  # generation, rows, more rows available
+
+class QueryWorker(Worker):
+    """
+    Runs an evaluation query on a thread pool thread with its own read connection.
+
+    The summary, the trend and the first chunk of rows are sent right away, further chunks only when
+    the view asks for them through request_more. cancel() interrupts a running statement.
+    """
+
+    def __init__(self, generation, filter_args, chunk_size):
+        super().__init__(QueryWorkerSignals())
+        self.generation = generation
+        self.filter_args = filter_args
+        self.chunk_size = chunk_size
+        self._requests = queue.Queue()
+        self._conn = None
+        self._conn_lock = threading.Lock()
+
+    def request_more(self):
+        """Ask the worker to send the next chunk of rows."""
+        self._requests.put(True)
+
+    def cancel(self):
+        """Stop the query, interrupting the statement that is currently running."""
+        super().cancel()
+        self._requests.put(False)
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def work(self):
+        with self._conn_lock:
+            if self.is_cancelled():
+                return
+            self._conn = connect()
+
+        try:
+            summary = fetch_summary(*self.filter_args, conn=self._conn)
+            if self.is_cancelled():
+                return
+            self.signals.summary_ready.emit(self.generation, summary)
+
+            trend = fetch_trend(*self.filter_args, conn=self._conn)
+            if self.is_cancelled():
+                return
+            self.signals.trend_ready.emit(self.generation, trend)
+
+            # Stored expenses with the recurring occurrences merged in
+            chunks = iter_expense_chunks(*self.filter_args, conn=self._conn, chunk_size=self.chunk_size)
+            while not self.is_cancelled():
+                rows = next(chunks, [])
+                more = len(rows) == self.chunk_size
+                self.signals.rows_ready.emit(self.generation, rows, more)
+
+                # Wait until the view needs more rows (or the query is cancelled)
+                if not more or not self._requests.get():
+                    break
+            chunks.close()
+        finally:
+            with self._conn_lock:
+                self._conn.close()
+                self._conn = None
+
+class ExportWorker(Worker):
+    """Streams the filtered expenses into a file on a thread pool thread with its own read connection."""
+
+    def __init__(self, path, fmt, filter_args):
+        super().__init__()
+        self.path = path
+        self.fmt = fmt
+        self.filter_args = filter_args
+
+    def on_progress(self, count):
+        self.signals.progress.emit(count)
+        return not self.is_cancelled()
+
+    def work(self):
+        conn = connect()
+        try:
+            return export_expenses(self.path, self.fmt, *self.filter_args, conn=conn, progress=self.on_progress)
+        finally:
+            conn.close()
+
+class ExpenseTableModel(QAbstractTableModel):
+    """Table model that receives expense rows in chunks from a QueryWorker as the view scrolls."""
+
+    HEADERS = ["Description", "Category", "Date", "Amount (€)", "Comment"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._worker = None
+        self._more = False
+        self._pending = False
+
+    def reset(self, worker):
+        """Clear the model, further rows are requested from the given worker."""
+        self.beginResetModel()
+        self._rows = []
+        self._worker = worker
+        self._more = True
+        self._pending = True  # The worker sends the first chunk on its own
+        self.endResetModel()
+
+    def append_rows(self, rows, more):
+        """Add a chunk of rows sent by the worker."""
+        self._pending = False
+        self._more = more
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def all_rows(self):
+        """Return the rows loaded so far."""
+        return list(self._rows)
+
+    def stop(self):
+        """Stop requesting rows from the worker."""
+        self._worker = None
+        self._more = False
+        self._pending = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self._rows[index.row()][index.column()]
+        if index.column() == AMOUNT_COLUMN:
+            return format_cents(value)
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._more and not self._pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._pending = True
+        self._worker.request_more()
+
+class QueryStatsDialog(QDialog):
+    """Shows the timings collected by the query instrumentation."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("sFinance - Query Stats")
+        self.resize(800, 400)
+
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor(50, 50, 50))  # Dark gray
+        self.setPalette(palette)
+
+        statements, phases = instrumentation.stats.snapshot()
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Phases:"))
+        layout.addWidget(self.build_table(
+            ["Phase", "Count", "Total (ms)", "Max (ms)"],
+            [(phase, count, total * 1000, worst * 1000) for phase, (count, total, worst) in sorted(phases.items())]))
+
+        layout.addWidget(QLabel("Statements (slowest first):"))
+        layout.addWidget(self.build_table(
+            ["Statement", "Count", "Total (ms)", "Max (ms)", "Rows"],
+            [(sql, count, total * 1000, worst * 1000, rows)
+             for sql, (count, total, worst, rows) in sorted(statements.items(), key=lambda item: -item[1][1])]))
+
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset_stats)
+        layout.addWidget(reset_button)
+        self.setLayout(layout)
+
+    def build_table(self, headers, rows):
+        table = QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        for row_idx, row_data in enumerate(rows):
+            for col_idx, value in enumerate(row_data):
+                text = f"{value:.2f}" if isinstance(value, float) else str(value)
+                table.setItem(row_idx, col_idx, QTableWidgetItem(text))
+        return table
+
+    def reset_stats(self):
+        instrumentation.stats.reset()
+        self.close()
+
+class BudgetDialog(QDialog):
+    """Over/under-budget report for one month, also used to set and remove the monthly budgets."""
+
+    OVER_BUDGET_COLOR = QColor("#FF3B30")
+
+    def __init__(self, month, categories, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("sFinance - Budgets")
+        self.resize(600, 450)
+
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor(50, 50, 50))  # Dark gray
+        self.setPalette(palette)
+
+        layout = QVBoxLayout()
+
+        layout.addWidget(QLabel("Month:"))
+        self.month_input = QDateEdit(self)
+        self.month_input.setCalendarPopup(True)
+        self.month_input.setDisplayFormat("MM/yyyy")
+        self.month_input.setDate(month)
+        self.month_input.dateChanged.connect(self.load_report)
+        layout.addWidget(self.month_input)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Category", "Budget (€)", "Spent (€)", "Remaining (€)"])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.total_label = QLabel("")
+        layout.addWidget(self.total_label)
+
+        layout.addWidget(QLabel("Category:"))
+        self.category_combo = QComboBox(self)
+        self.category_combo.setEditable(True)  # Budgets can be set before a category has expenses
+        self.category_combo.addItems(categories)
+        layout.addWidget(self.category_combo)
+
+        layout.addWidget(QLabel("Monthly Budget:"))
+        self.limit_input = QLineEdit(self)
+        self.limit_input.setPlaceholderText("Enter amount")
+        self.limit_input.returnPressed.connect(self.save_budget)
+        layout.addWidget(self.limit_input)
+
+        self.set_button = QPushButton("Set Budget")
+        self.set_button.clicked.connect(self.save_budget)
+        layout.addWidget(self.set_button)
+
+        self.remove_button = QPushButton("Remove Selected Budget")
+        self.remove_button.clicked.connect(self.remove_budget)
+        layout.addWidget(self.remove_button)
+
+        self.setLayout(layout)
+        self.load_report()
+
+    def load_report(self):
+        report = budget_report(self.month_input.date().toString("yyyy-MM"))
+        self.table.setRowCount(len(report))
+        for row_idx, (category, limit_cents, spent_cents, remaining_cents) in enumerate(report):
+            for col_idx, text in enumerate([category, format_cents(limit_cents), format_cents(spent_cents),
+                                            format_cents(remaining_cents)]):
+                item = QTableWidgetItem(text)
+                if remaining_cents < 0:
+                    item.setForeground(self.OVER_BUDGET_COLOR)
+                self.table.setItem(row_idx, col_idx, item)
+
+        over = sum(1 for row in report if row[3] < 0)
+        self.total_label.setText(f"{over} of {len(report)} budgets exceeded" if report else "No budgets set")
+
+    def save_budget(self):
+        try:
+            set_budget(self.category_combo.currentText().strip(), self.limit_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        self.limit_input.clear()
+        self.load_report()
+
+    def remove_budget(self):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        delete_budget(self.table.item(row, 0).text())
+        self.load_report()
+
 class DataEvaluationApp(QWidget):
+    CHUNK_SIZE = 256  # Rows per chunk sent by the query worker
+
     def __init__(self, main_window):
         super().__init__()
 
         self.main_window = main_window  # Store reference to the main window
 
         self.setWindowTitle("sFinance - Data Evaluation")
-        self.setGeometry(100, 100, 600, 400)
+        self.setGeometry(100, 100, 600, 600)
 
         # Setze das App-Icon, Pfad wird mit resource_path dynamisch gefunden
         self.setWindowIcon(QIcon(resource_path('assets/logo.png')))
@@ -48,7 +354,7 @@ class DataEvaluationApp(QWidget):
         # Time filter
         self.time_filter_label = QLabel("Time Filter:")
         self.time_filter_combo = QComboBox(self)
-        self.time_filter_combo.addItems(["Day", "Week", "Month", "Custom Range"])
+        self.time_filter_combo.addItems(TIME_FILTERS)
         self.time_filter_combo.currentTextChanged.connect(self.update_time_filter_ui)
 
         # Date input fields for specific filters
@@ -101,7 +407,13 @@ class DataEvaluationApp(QWidget):
         # Category filter
         self.category_label = QLabel("Category:")
         self.category_combo = QComboBox(self)
-        self.load_categories()  # Load categories into the dropdown
+        # Categories are loaded into the dropdown every time the window is shown
+
+        # Full-text search over description and comment
+        self.search_label = QLabel("Search:")
+        self.search_input = QLineEdit(self)
+        self.search_input.setPlaceholderText("Words in description or comment")
+        self.search_input.returnPressed.connect(self.apply_filter)
 
         self.filter_button = QPushButton("Apply Filter")
         self.filter_button.clicked.connect(self.apply_filter)
@@ -110,6 +422,8 @@ class DataEvaluationApp(QWidget):
         filter_layout.addWidget(self.time_filter_combo)
         filter_layout.addWidget(self.category_label)
         filter_layout.addWidget(self.category_combo)
+        filter_layout.addWidget(self.search_label)
+        filter_layout.addWidget(self.search_input)
 
         # Add all time-related widgets to the layout but hide them initially
         filter_layout.addWidget(self.single_date_label)
@@ -127,15 +441,60 @@ class DataEvaluationApp(QWidget):
 
         layout.addLayout(filter_layout)
 
-        # Table to display expenses
-        self.expense_table = QTableWidget()
-        self.expense_table.setColumnCount(5)
-        self.expense_table.setHorizontalHeaderLabels(["Description", "Category", "Date", "Amount (€)", "Comment"])
+        # Table to display expenses, rows are fetched lazily by the model
+        self.expense_model = ExpenseTableModel(self)
+        self.expense_table = QTableView()
+        self.expense_table.setModel(self.expense_model)
         layout.addWidget(self.expense_table)
 
-        # Label to display total sum
+        # Shows how many of the matching rows have been loaded
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("%v / %m rows loaded")
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
+        # Queries run on a pool of their own, a worker waiting for the view to scroll must not take a
+        # thread of the global pool from export, backup and suggestion workers. Each filter change
+        # starts a new generation.
+        self.query_pool = QThreadPool(self)
+        self.query_worker = None
+        self.query_generation = 0
+        self.query_key = None
+        self.query_version = None
+        self.query_summary = None
+        self.query_trend = None
+
+        # Summary panel, filled from SQL aggregates so it does not depend on the loaded rows
         self.total_label = QLabel("Total Sum: 0.00 €")
+        self.stats_label = QLabel("Expenses: 0")
+        self.category_summary_label = QLabel("")
         layout.addWidget(self.total_label)
+        layout.addWidget(self.stats_label)
+        layout.addWidget(self.category_summary_label)
+
+        # Spending over time, bucketed in SQL by day, week or month depending on the range
+        self.trend_mode_combo = QComboBox(self)
+        self.trend_mode_combo.addItems(TREND_MODES)
+        self.trend_chart = TrendChart(self)
+        self.trend_mode_combo.currentTextChanged.connect(self.trend_chart.set_mode)
+        layout.addWidget(self.trend_mode_combo)
+        layout.addWidget(self.trend_chart)
+
+        # Export of the current filter
+        self.export_button = QPushButton("Export")
+        self.export_button.clicked.connect(self.export_expenses)
+        layout.addWidget(self.export_button)
+
+        # Spending against the monthly budgets
+        self.budget_button = QPushButton("Budgets")
+        self.budget_button.clicked.connect(self.show_budgets)
+        layout.addWidget(self.budget_button)
+
+        # Query timings, only available when the instrumentation is turned on (SFINANCE_PROFILE=1)
+        if instrumentation.is_enabled():
+            self.stats_button = QPushButton("Query Stats")
+            self.stats_button.clicked.connect(self.show_query_stats)
+            layout.addWidget(self.stats_button)
 
         # Back button to return to main window
         self.back_button = QPushButton("Back")
@@ -147,48 +506,24 @@ class DataEvaluationApp(QWidget):
         # Initialize with correct UI based on default filter
         self.update_time_filter_ui()
 
-        # Apply the stylesheet for the design
-        self.setStyleSheet("""
-            QWidget {
-                font-size: 16px;
-                color: white;
-            }
-            QLineEdit, QComboBox, QDateEdit, QTextEdit {
-                background-color: #f5f5f5;
-                border-radius: 10px;
-                padding: 8px;
-                color: black;  /* Black text for input fields */
-            }
-            QComboBox QAbstractItemView {
-                background-color: white;
-                color: black;  /* Black text in dropdown menu */
-            }
-            QTableWidget {
-                background-color: white;
-                color: black;  /* Black text in table */
-            }
-            QTableWidget QHeaderView::section {
-                background-color: #007AFF;
-                color: white;  /* Header in blue with white text */
-            }
-            QPushButton {
-                background-color: #007AFF;
-                color: white;
-                border-radius: 10px;
-                padding: 10px;
-            }
-            QPushButton:hover {
-                background-color: #005BBB;
-            }
-        """)
-
     def load_categories(self):
-        """Load distinct categories from the database into the dropdown."""
-        cursor.execute("SELECT DISTINCT category FROM expenses")
-        categories = cursor.fetchall()
-        self.category_combo.addItem("All Categories")  # Default option to show all categories
-        for category in categories:
-            self.category_combo.addItem(category[0])
+        """Load distinct categories from the database into the dropdown, keeping the current selection."""
+        current = self.category_combo.currentText()
+        self.category_combo.clear()
+        self.category_combo.addItem(ALL_CATEGORIES)  # Default option to show all categories
+        for category in fetch_categories():
+            self.category_combo.addItem(category)
+
+        index = self.category_combo.findText(current)
+        if index >= 0:
+            self.category_combo.setCurrentIndex(index)
+
+    def showEvent(self, event):
+        """The window is reused, so pick up expenses that were added while it was hidden."""
+        super().showEvent(event)
+        self.load_categories()
+        if self.query_generation:
+            self.apply_filter()
 
     def update_time_filter_ui(self):
         """Update the UI to show relevant input fields based on selected time filter."""
@@ -219,65 +554,179 @@ class DataEvaluationApp(QWidget):
             self.end_date_label.show()
             self.end_date_input.show()
 
+    def get_date_range(self, time_filter):
+        """Return the [start, end) date range for the selected time filter as yyyy-MM-dd strings."""
+        if time_filter == "Month":
+            return date_range(time_filter, self.month_input.date().toPyDate())
+        return date_range(time_filter, self.single_date_input.date().toPyDate(),
+                          self.start_date_input.date().toPyDate(), self.end_date_input.date().toPyDate())
+
     def apply_filter(self):
-        time_filter = self.time_filter_combo.currentText()
+        start_date, end_date = self.get_date_range(self.time_filter_combo.currentText())
         category = self.category_combo.currentText()
-
-        query = "SELECT description, category, date, amount, comment FROM expenses WHERE 1=1"
-        params = []
-
-        # Filter by time range
-        if time_filter == "Day":
-            date = self.single_date_input.date().toString("yyyy-MM-dd")
-            query += " AND date = ?"
-            params.append(date)
-        elif time_filter == "Week":
-            date = self.single_date_input.date().toString("yyyy-MM-dd")
-            query += " AND strftime('%W', date) = strftime('%W', ?)"
-            params.append(date)
-        elif time_filter == "Month":
-            month = self.month_input.date().toString("MM")
-            year = self.month_input.date().toString("yyyy")
-            query += " AND strftime('%m', date) = ? AND strftime('%Y', date) = ?"
-            params.append(month)
-            params.append(year)
-        elif time_filter == "Custom Range":
-            start_date = self.start_date_input.date().toString("yyyy-MM-dd")
-            end_date = self.end_date_input.date().toString("yyyy-MM-dd")
-            query += " AND date BETWEEN ? AND ?"
-            params.append(start_date)
-            params.append(end_date)
-
-        # Filter by category (only if a specific category is selected)
-        if category != "All Categories":
-            query += " AND category = ?"
-            params.append(category)
-
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-
-        # Populate the table
-        self.expense_table.setRowCount(0)  # Clear existing rows
-        total_sum = 0
-
-        for row_idx, row_data in enumerate(results):
-            self.expense_table.insertRow(row_idx)
-            for col_idx, col_data in enumerate(row_data):
-                self.expense_table.setItem(row_idx, col_idx, QTableWidgetItem(str(col_data)))
-
-            # Add the amount to the total sum
-            total_sum += float(row_data[3])
-
-        # Update the total sum label
-        self.total_label.setText(f"Total Sum: {total_sum:.2f} €")
+        search = self.search_input.text().strip()
+        # A new filter makes the running query stale
+        self.cancel_query()
+        self.query_generation += 1
+
+        # Repeated filters are answered from the cache while the data is unchanged
+        self.query_key = (start_date, end_date, category, search)
+        self.query_version = query_cache.current_version()
+        cached = query_cache.get(("rows",) + self.query_key)
+        if cached is not None:
+            summary, trend, rows = cached
+            self.update_summary(summary)
+            self.trend_chart.set_trend(trend)
+            self.expense_model.reset(None)
+            self.expense_model.append_rows(rows, False)
+            self.progress_bar.hide()
+            return
+
+        self.query_summary = query_cache.get(("summary",) + self.query_key)
+        if self.query_summary is not None:
+            self.update_summary(self.query_summary)
+
+        # The chart keeps showing the previous trend until the new one arrives
+        self.query_trend = query_cache.get(("trend",) + self.query_key)
+        if self.query_trend is not None:
+            self.trend_chart.set_trend(self.query_trend)
+
+        self.query_worker = QueryWorker(self.query_generation, self.query_key, self.CHUNK_SIZE)
+        self.query_worker.signals.summary_ready.connect(self.on_summary_ready)
+        self.query_worker.signals.trend_ready.connect(self.on_trend_ready)
+        self.query_worker.signals.rows_ready.connect(self.on_rows_ready)
+        self.query_worker.signals.failed.connect(
+            lambda message, generation=self.query_generation: self.on_query_failed(generation, message))
+
+        # The model only requests the rows that are scrolled into view
+        self.expense_model.reset(self.query_worker)
+
+        # Busy indicator until the row count is known
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+
+        self.query_worker.start(self.query_pool)
+
+    def cancel_query(self):
+        """Cancel the running query, if any."""
+        if self.query_worker is not None:
+            self.query_worker.cancel()
+            self.query_worker = None
+        self.expense_model.stop()
+
+    def on_summary_ready(self, generation, summary):
+        if generation != self.query_generation:
+            return  # Result of a stale query
+        self.query_summary = summary
+        query_cache.put(("summary",) + self.query_key, summary, self.query_version)
+        self.update_summary(summary)
+        self.progress_bar.setRange(0, summary["count"])
+        self.progress_bar.setValue(0)
+
+    def on_trend_ready(self, generation, trend):
+        if generation != self.query_generation:
+            return
+        self.query_trend = trend
+        query_cache.put(("trend",) + self.query_key, trend, self.query_version)
+        self.trend_chart.set_trend(trend)
+
+    def on_rows_ready(self, generation, rows, more):
+        if generation != self.query_generation:
+            return
+        start = time.perf_counter()
+        self.expense_model.append_rows(rows, more)
+        instrumentation.record_phase("render", time.perf_counter() - start)
+        self.progress_bar.setValue(self.expense_model.rowCount())
+        if not more:
+            self.progress_bar.hide()
+            self.query_worker = None
+            if self.expense_model.rowCount() * MIN_ROW_BYTES <= query_cache.max_entry_bytes:
+                query_cache.put(("rows",) + self.query_key,
+                                (self.query_summary, self.query_trend, self.expense_model.all_rows()),
+                                self.query_version)
+
+    def on_query_failed(self, generation, message):
+        if generation != self.query_generation:
+            return
+        self.expense_model.stop()
+        self.progress_bar.hide()
+        self.query_worker = None
+        QMessageBox.warning(self, "Error", f"The query failed: {message}")
+
+    def update_summary(self, summary):
+        """Show the aggregated totals in the summary panel."""
+        self.total_label.setText(f"Total Sum: {format_cents(summary['total_cents'])} €")
+
+        if summary["count"]:
+            self.stats_label.setText(f"Expenses: {summary['count']} | "
+                                     f"Min: {format_cents(summary['min_cents'])} € | "
+                                     f"Max: {format_cents(summary['max_cents'])} €")
+        else:
+            self.stats_label.setText("Expenses: 0")
+
+        self.category_summary_label.setText("\n".join(
+            f"{category}: {format_cents(total_cents)} € ({count})"
+            for category, total_cents, count in summary["by_category"]))
+
+    EXPORT_FILTERS = {
+        "csv": "CSV (*.csv)",
+        "jsonl": "JSON Lines (*.jsonl)",
+        "parquet": "Parquet (*.parquet)",
+    }
+
+    def export_expenses(self):
+        """Export the expenses matching the current filter to a file chosen by the user."""
+        name_filters = [self.EXPORT_FILTERS[fmt] for fmt in EXPORT_FORMATS]
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Export Expenses", "expenses.csv",
+                                                            ";;".join(name_filters))
+        if not path:
+            return
+
+        default_format = EXPORT_FORMATS[name_filters.index(selected_filter)] if selected_filter in name_filters else "csv"
+        fmt = format_from_path(path, default_format)
+
+        start_date, end_date = self.get_date_range(self.time_filter_combo.currentText())
+        filter_args = (start_date, end_date, self.category_combo.currentText(), self.search_input.text().strip())
+
+        # The row count from the summary gives the progress dialog its maximum, it is cheap from the rollups
+        total = fetch_summary(*filter_args)["count"]
+        progress_dialog = QProgressDialog("Exporting expenses...", "Cancel", 0, total, self)
+        progress_dialog.setWindowTitle("sFinance - Export")
+        progress_dialog.setMinimumDuration(0)
+
+        worker = ExportWorker(path, fmt, filter_args)
+        worker.signals.progress.connect(progress_dialog.setValue)
+        worker.signals.finished.connect(progress_dialog.close)
+        worker.signals.finished.connect(
+            lambda count: QMessageBox.information(self, "Success", f"Exported {count} expenses."))
+        worker.signals.failed.connect(progress_dialog.close)
+        worker.signals.failed.connect(lambda message: QMessageBox.warning(self, "Error", f"Export failed: {message}"))
+        progress_dialog.canceled.connect(worker.cancel)
+        worker.start()
+
+    def show_budgets(self):
+        """Show the budget report for the month the current filter starts in."""
+        start_date, _ = self.get_date_range(self.time_filter_combo.currentText())
+        categories = [self.category_combo.itemText(i) for i in range(1, self.category_combo.count())]
+        BudgetDialog(QDate.fromString(start_date, "yyyy-MM-dd"), categories, self).exec()
+
+    def show_query_stats(self):
+        QueryStatsDialog(self).exec()
+
+    def closeEvent(self, event):
+        """Make sure no query worker keeps waiting once the window is closed."""
+        self.cancel_query()
+        super().closeEvent(event)
 
     def go_back_to_main(self):
         """Close the data evaluation window and return to the main window."""
+        self.cancel_query()
         self.close()
         self.main_window.show()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.setStyleSheet(APP_STYLESHEET)
     window = DataEvaluationApp(None)  # For standalone testing, pass None for the main window
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,114 @@
+"""Streaming export of filtered expenses to CSV, JSON Lines and (with pyarrow installed) Parquet."""
+import csv
+import json
+import os
+from core import AMOUNT_COLUMN, ALL_CATEGORIES, cents_to_decimal, format_cents, iter_expense_chunks
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+CHUNK_SIZE = 5000
+
+EXPORT_FORMATS = ["csv", "jsonl", "parquet"] if pyarrow else ["csv", "jsonl"]
+
+# Exported columns, the amount is written as a decimal amount instead of cents
+EXPORT_COLUMNS = ["description", "category", "date", "amount", "comment"]
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def format_from_path(path, default="csv"):
+    """Guess the export format from a file extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "json":
+        extension = "jsonl"
+    return extension if extension in EXPORT_FORMATS else default
+
+
+def write_csv(f, chunks, progress):
+    writer = csv.writer(f)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(row[:AMOUNT_COLUMN] + (format_cents(row[AMOUNT_COLUMN]),) + row[AMOUNT_COLUMN + 1:]
+                         for row in rows)
+        progress(len(rows))
+
+
+def write_jsonl(f, chunks, progress):
+    for rows in chunks:
+        for row in rows:
+            record = dict(zip(EXPORT_COLUMNS, row))
+            # A decimal string like in the CSV, a float would not keep the amount exact
+            record["amount"] = format_cents(row[AMOUNT_COLUMN])
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        progress(len(rows))
+
+
+def write_parquet(path, chunks, progress):
+    schema = pyarrow.schema([
+        ("description", pyarrow.string()),
+        ("category", pyarrow.string()),
+        ("date", pyarrow.string()),
+        ("amount", pyarrow.decimal128(18, 2)),
+        ("comment", pyarrow.string()),
+    ])
+    # One row group per chunk, so only a single chunk is held in memory
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            columns = [list(column) for column in zip(*rows)]
+            columns[AMOUNT_COLUMN] = [cents_to_decimal(cents) for cents in columns[AMOUNT_COLUMN]]
+            columns = [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)]
+            writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+            progress(len(rows))
+
+
+def export_expenses(output, fmt, start_date, end_date, category=ALL_CATEGORIES, search=None, conn=None,
+                    progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream the expenses matching a filter into output, a file path or (for csv/jsonl) an open text file.
+
+    Rows are read and written chunk by chunk, so memory use does not grow with the number of rows.
+    progress is called with the number of rows written so far after each chunk and may return False
+    to cancel, which raises ExportCancelled. A file path is only replaced once the export succeeded.
+    Returns the number of exported rows.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+
+    written = 0
+
+    def on_chunk(count):
+        nonlocal written
+        written += count
+        if progress and progress(written) is False:
+            raise ExportCancelled()
+
+    chunks = iter_expense_chunks(start_date, end_date, category, search, conn, chunk_size)
+
+    if not isinstance(output, str):
+        if fmt == "parquet":
+            raise ValueError("Parquet can only be exported to a file")
+        (write_csv if fmt == "csv" else write_jsonl)(output, chunks, on_chunk)
+        return written
+
+    # Write next to the target first, so a cancelled or failed export leaves no partial file behind
+    partial_path = output + ".part"
+    try:
+        if fmt == "parquet":
+            write_parquet(partial_path, chunks, on_chunk)
+        else:
+            with open(partial_path, "w", newline="", encoding="utf-8") as f:
+                (write_csv if fmt == "csv" else write_jsonl)(f, chunks, on_chunk)
+        os.replace(partial_path, output)
+    except BaseException:
+        chunks.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return written
@@ -0,0 +1,159 @@
+import csv
+import json
+import sys
+from datetime import datetime
+from repository import INSERT_EXPENSE, bump_write_version, find_duplicates, get_connection, close_connection
+from core import parse_amount
+
+# Default column mapping: expense field -> column name in the CSV file
+DEFAULT_MAPPING = {
+    "columns": {
+        "description": "description",
+        "category": "category",
+        "date": "date",
+        "amount": "amount",
+        "comment": "comment",
+    },
+    "delimiter": ",",
+    "encoding": "utf-8",
+    "date_formats": ["%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"],
+    "default_category": "Other",
+    # Bank statements usually list expenses as negative amounts
+    "negate_amounts": False,
+    # Rows already stored (same date, amount and description) are rejected, e.g. on overlapping statements
+    "skip_duplicates": True,
+}
+
+BATCH_SIZE = 5000
+
+
+def load_mapping(path=None):
+    """Load a column mapping config from a JSON file, falling back to the defaults for missing keys."""
+    mapping = dict(DEFAULT_MAPPING)
+    mapping["columns"] = dict(DEFAULT_MAPPING["columns"])
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        mapping["columns"].update(config.pop("columns", {}))
+        mapping.update(config)
+    return mapping
+
+
+def parse_date(text, date_formats):
+    """Normalize a date in any of the configured formats to YYYY-MM-DD."""
+    text = text.strip()
+    for date_format in date_formats:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date '{text}'")
+
+
+def normalize_row(record, mapping):
+    """Turn one CSV record into an expense tuple, raising ValueError if it is invalid."""
+    columns = mapping["columns"]
+
+    def field(name):
+        column = columns.get(name)
+        value = record.get(column) if column else None
+        return value.strip() if value else ""
+
+    description = field("description")
+    if not description:
+        raise ValueError("missing description")
+
+    amount_text = field("amount")
+    if not amount_text:
+        raise ValueError("missing amount")
+    try:
+        # Same decimal separator handling as add_expense, minus currency symbols and spaces
+        amount_cents = parse_amount(amount_text.replace("€", "").replace(" ", ""))
+    except ValueError:
+        raise ValueError(f"invalid amount '{amount_text}'")
+    if mapping["negate_amounts"]:
+        amount_cents = -amount_cents
+
+    date = parse_date(field("date"), mapping["date_formats"])
+    category = field("category") or mapping["default_category"]
+
+    return (description, category, date, amount_cents, field("comment"))
+
+
+def import_csv(conn, path, mapping=None, progress=None, batch_size=BATCH_SIZE):
+    """
+    Stream a CSV file into the expenses table.
+
+    Rows are inserted with executemany in batches, all inside one transaction.
+    progress is called with the number of processed rows after each batch.
+    Returns the number of imported rows and a list of (line number, reason) for rejected rows.
+
+    With skip_duplicates, a row is rejected while the database has more stored expenses with its
+    fingerprint than rows of this file already matched. Re-importing an overlapping statement adds
+    only the new rows, two identical rows in one statement are both kept on the first import.
+    """
+    mapping = mapping or load_mapping()
+    imported = 0
+    rejected = []
+    batch = []
+    unmatched = {}  # fingerprint -> stored expenses not yet matched by a row of this file
+
+    with open(path, newline="", encoding=mapping["encoding"]) as f:
+        reader = csv.DictReader(f, delimiter=mapping["delimiter"])
+        try:
+            conn.execute("BEGIN")
+            for record in reader:
+                try:
+                    row = normalize_row(record, mapping)
+                except ValueError as e:
+                    rejected.append((reader.line_num, str(e)))
+                    continue
+
+                if mapping["skip_duplicates"]:
+                    description, _, date, amount_cents, _ = row
+                    fingerprint, stored = find_duplicates(description, date, amount_cents, conn)
+                    # Counted once per fingerprint, before this file's rows with it are inserted
+                    unmatched.setdefault(fingerprint, stored)
+                    if unmatched[fingerprint]:
+                        unmatched[fingerprint] -= 1
+                        rejected.append((reader.line_num, "duplicate of a stored expense"))
+                        continue
+
+                batch.append(row)
+
+                if len(batch) >= batch_size:
+                    conn.executemany(INSERT_EXPENSE, batch)
+                    imported += len(batch)
+                    batch = []
+                    if progress:
+                        progress(imported + len(rejected))
+
+            if batch:
+                conn.executemany(INSERT_EXPENSE, batch)
+                imported += len(batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            bump_write_version()
+
+    if progress:
+        progress(imported + len(rejected))
+
+    return imported, rejected
+
+
+if __name__ == "__main__":
+    # Usage: python importer.py statement.csv [mapping.json]
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python importer.py statement.csv [mapping.json]")
+
+    conn = get_connection()
+    imported, rejected = import_csv(conn, sys.argv[1], load_mapping(sys.argv[2] if len(sys.argv) > 2 else None),
+                                    progress=lambda count: print(f"{count} rows processed", file=sys.stderr))
+    close_connection()
+
+    for line_num, reason in rejected:
+        print(f"Rejected line {line_num}: {reason}")
+    print(f"Imported {imported} expenses, rejected {len(rejected)} rows.")
@@ -0,0 +1,215 @@
+"""
+Opt-in query instrumentation.
+
+Set SFINANCE_PROFILE=1 (and optionally SFINANCE_SLOW_QUERY_MS, default 100) to time every statement
+executed on connections opened by the repository. Statements slower than the threshold are written
+to a rotating log together with their EXPLAIN QUERY PLAN output.
+"""
+import logging
+import logging.handlers
+import os
+import sqlite3
+import threading
+import time
+
+LOG_PATH = os.path.join('data', 'query.log')
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+logger = logging.getLogger("sfinance.queries")
+
+_enabled = False
+_slow_query_seconds = 0.1
+
+
+class QueryStats:
+    """Thread-safe aggregated timings per statement and per phase (query, fetch, render)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements = {}  # sql -> [count, total seconds, max seconds, rows]
+        self.phases = {}  # phase -> [count, total seconds, max seconds]
+
+    def record_statement(self, sql, seconds, rows):
+        sql = " ".join(sql.split())
+        with self._lock:
+            entry = self.statements.setdefault(sql, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows
+
+    def record_phase(self, phase, seconds):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def snapshot(self):
+        """Return copies of the statement and phase statistics."""
+        with self._lock:
+            return ({sql: list(entry) for sql, entry in self.statements.items()},
+                    {phase: list(entry) for phase, entry in self.phases.items()})
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.phases.clear()
+
+
+stats = QueryStats()
+
+
+def enable(slow_query_ms=100, log_path=LOG_PATH):
+    """Turn on instrumentation for connections opened from now on."""
+    global _enabled, _slow_query_seconds
+    _enabled = True
+    _slow_query_seconds = slow_query_ms / 1000
+
+    if not logger.handlers:
+        directory = os.path.dirname(log_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES,
+                                                       backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record_phase(phase, seconds):
+    """Record the duration of an application phase, e.g. rendering rows, if instrumentation is on."""
+    if _enabled:
+        stats.record_phase(phase, seconds)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that measures execute and fetch time and counts the rows returned."""
+
+    _sql = None
+
+    def _start(self, sql, parameters):
+        self._finish()
+        self._sql = sql
+        self._parameters = parameters
+        self._query_time = 0.0
+        self._fetch_time = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        """Record the current statement once it is done."""
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+
+        total = self._query_time + self._fetch_time
+        stats.record_statement(sql, total, self._rows)
+        stats.record_phase("query", self._query_time)
+        stats.record_phase("fetch", self._fetch_time)
+
+        if total >= _slow_query_seconds:
+            log_slow_query(self.connection, sql, self._parameters, total, self._rows)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._query_time = time.perf_counter() - start
+            if self.description is None:
+                # No result rows to fetch (INSERT, UPDATE, ...), the statement is done
+                self._rows = max(self.rowcount, 0)
+                self._finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._query_time = time.perf_counter() - start
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        self._fetch_time += time.perf_counter() - start
+        return rows
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed_fetch(super().fetchmany, size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed_fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Single row lookups (fetchone) drop the cursor without reading to the end of the result
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements all run on InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def log_slow_query(conn, sql, parameters, seconds, rows):
+    """Write a slow statement and its query plan to the query log."""
+    plan = ""
+    if parameters is not None:
+        try:
+            # A plain cursor, so the EXPLAIN itself is not instrumented
+            plan_rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            plan = "\n".join(f"    {row[-1]}" for row in plan_rows)
+        except sqlite3.Error as e:
+            plan = f"    (no plan: {e})"
+
+    logger.info("slow statement: %.1f ms, %d rows\n    %s\n%s", seconds * 1000, rows, " ".join(sql.split()), plan)
+
+
+if os.environ.get("SFINANCE_PROFILE") == "1":
+    enable(float(os.environ.get("SFINANCE_SLOW_QUERY_MS", "100")))
@@ -1,9 +1,13 @@
+import time
+STARTUP_TIME = time.perf_counter()  # Taken before the imports so --measure-startup includes them
+
 import sys
 import os
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QMessageBox
+from PyQt6.QtCore import QTimer
 from PyQt6.QtGui import QPalette, QColor, QIcon
-from sfinance import SFinanceApp
-from data import DataEvaluationApp
+from styles import APP_STYLESHEET
+from workers import Worker
 
 # Funktion, um den Pfad zu Ressourcen zu finden, unabhängig davon, ob das Programm als Skript oder EXE ausgeführt wird
 def resource_path(relative_path):
@@ -16,12 +20,18 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-# Create the data directory if it doesn't exist
-if not os.path.exists('data'):
-    os.makedirs('data')
+class BackupWorker(Worker):
+    """Backs up the database on a thread pool thread, the app stays usable while it runs."""
+
+    def work(self):
+        # Imported here, so the backup code doesn't add to the startup time
+        import backup
+        return backup.create_backup()
 
 # Main window class
 class MainApp(QWidget):
+    BACKUP_CHECK_INTERVAL_MS = 60 * 60 * 1000  # Hourly check whether a scheduled backup is due
+    FIRST_BACKUP_CHECK_MS = 10 * 1000  # Leave the startup alone
     def __init__(self):
         super().__init__()
 
@@ -47,37 +57,90 @@ class MainApp(QWidget):
         self.evaluate_data_button = QPushButton("Evaluate Data")
         self.evaluate_data_button.clicked.connect(self.open_evaluate_data_window)
 
+        self.backup_button = QPushButton("Backup Now")
+        self.backup_button.clicked.connect(self.backup_now)
+
         # Add buttons to layout
         layout.addWidget(self.add_expense_button)
         layout.addWidget(self.evaluate_data_button)
+        layout.addWidget(self.backup_button)
 
         self.setLayout(layout)
 
-        # Apply the same stylesheet for buttons as in sFinanceApp
-        self.setStyleSheet("""
-            QPushButton {
-                background-color: #007AFF;
-                color: white;
-                border-radius: 10px;
-                padding: 10px;
-            }
-            QPushButton:hover {
-                background-color: #005BBB;
-            }
-        """)
+        # The sub windows are imported and built on first use, then reused
+        self.expense_window = None
+        self.data_window = None
+
+        # Scheduled backups, made when the last one is older than backup.BACKUP_INTERVAL
+        self.backup_worker = None
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.scheduled_backup)
+        self.backup_timer.start(self.BACKUP_CHECK_INTERVAL_MS)
+        QTimer.singleShot(self.FIRST_BACKUP_CHECK_MS, self.scheduled_backup)
 
     def open_add_expense_window(self):
-        self.expense_window = SFinanceApp(self)  # Pass self (MainApp) as argument
+        if self.expense_window is None:
+            from sfinance import SFinanceApp
+            self.expense_window = SFinanceApp(self)  # Pass self (MainApp) as argument
         self.expense_window.show()
         self.hide()  # Hide the main window when opening the add expense window
 
     def open_evaluate_data_window(self):
-        self.data_window = DataEvaluationApp(self)  # Pass self (MainApp) as the main window argument
+        if self.data_window is None:
+            from data import DataEvaluationApp
+            self.data_window = DataEvaluationApp(self)  # Pass self (MainApp) as the main window argument
         self.data_window.show()
         self.hide()  # Hide the main window when opening the data evaluation window
 
+    def start_backup(self, notify=False):
+        """
+        Start a backup on the thread pool, unless one is already running, and return whether it was started.
+        notify reports the result in a message box.
+        """
+        if self.backup_worker is not None:
+            return False
+        self.backup_worker = worker = BackupWorker()
+        worker.signals.done.connect(self.on_backup_done)
+        if notify:
+            worker.signals.finished.connect(
+                lambda path: QMessageBox.information(self, "Success", f"Backup written to {path}."))
+            worker.signals.failed.connect(
+                lambda message: QMessageBox.warning(self, "Error", f"Backup failed: {message}"))
+        worker.start()
+        return True
+
+    def on_backup_done(self):
+        self.backup_worker = None
+        self.backup_button.setEnabled(True)
+
+    def scheduled_backup(self):
+        import backup
+        if os.path.exists(backup.DB_PATH) and backup.backup_due():
+            self.start_backup()
+
+    def backup_now(self):
+        if self.start_backup(notify=True):
+            self.backup_button.setEnabled(False)
+
+def report_startup_time(app, window_built_time):
+    """Print the startup phases for --measure-startup and quit."""
+    shown_time = time.perf_counter()
+    print(f"Imports and window setup: {(window_built_time - STARTUP_TIME) * 1000:.1f} ms")
+    print(f"Time to first window: {(shown_time - STARTUP_TIME) * 1000:.1f} ms")
+    app.quit()
+
 if __name__ == "__main__":
+    # Start with --measure-startup to print the time to the first window and exit
+    measure_startup = "--measure-startup" in sys.argv
+
     app = QApplication(sys.argv)
+    app.setStyleSheet(APP_STYLESHEET)  # Parsed once for all windows
     window = MainApp()
     window.show()
+
+    if measure_startup:
+        window_built_time = time.perf_counter()
+        # Fires once the event loop has processed the first show and paint events
+        QTimer.singleShot(0, lambda: report_startup_time(app, window_built_time))
+
     sys.exit(app.exec())
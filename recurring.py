@@ -0,0 +1,133 @@
+"""
+Recurring expenses (rent, subscriptions, insurance), stored once as rules and expanded at query time.
+
+Only the occurrences inside a requested range are generated, nothing is written to the expenses
+table unless the user materializes the occurrences up to a date.
+"""
+import calendar
+import collections
+import datetime
+import heapq
+from repository import INSERT_EXPENSE, bump_write_version, find_duplicates, get_connection
+
+INTERVAL_UNITS = ["day", "week", "month", "year"]
+
+RULE_COLUMNS = ["id", "description", "category", "amount_cents", "comment", "interval_unit", "interval_count",
+                "start_date", "end_date", "materialized_until"]
+RecurringRule = collections.namedtuple("RecurringRule", RULE_COLUMNS)
+
+SELECT_RULES = f"SELECT {', '.join(RULE_COLUMNS)} FROM recurring_rules"
+
+
+def add_months(day, months, anchor_day):
+    """Move day by a number of months, on anchor_day or the last day of shorter months."""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return datetime.date(year, month + 1, min(anchor_day, calendar.monthrange(year, month + 1)[1]))
+
+
+def nth_occurrence(rule_start, interval_unit, interval_count, n):
+    """Return the date of the n-th occurrence (0 = rule start) of a rule."""
+    if interval_unit == "day":
+        return rule_start + datetime.timedelta(days=n * interval_count)
+    if interval_unit == "week":
+        return rule_start + datetime.timedelta(weeks=n * interval_count)
+    months = n * interval_count * (12 if interval_unit == "year" else 1)
+    # Always counted from the rule start, so a rule on the 31st stays on the 31st after February
+    return add_months(rule_start, months, rule_start.day)
+
+
+def occurrences(rule, start_date, end_date):
+    """
+    Yield the dates of a rule's occurrences in [start_date, end_date) as YYYY-MM-DD strings.
+
+    The first occurrence in the range is computed directly instead of walking from the rule start,
+    and occurrences before materialized_until are skipped, they are stored as expenses.
+    """
+    rule_start = datetime.date.fromisoformat(rule.start_date)
+    first = max(rule_start, datetime.date.fromisoformat(start_date))
+    if rule.materialized_until:
+        first = max(first, datetime.date.fromisoformat(rule.materialized_until))
+    last = datetime.date.fromisoformat(end_date)
+    if rule.end_date:
+        last = min(last, datetime.date.fromisoformat(rule.end_date) + datetime.timedelta(days=1))
+
+    if rule.interval_unit in ("day", "week"):
+        step = rule.interval_count * (7 if rule.interval_unit == "week" else 1)
+        n = -(-(first - rule_start).days // step)  # Ceiling division
+    else:
+        step = rule.interval_count * (12 if rule.interval_unit == "year" else 1)
+        n = ((first.year - rule_start.year) * 12 + first.month - rule_start.month) // step
+        while nth_occurrence(rule_start, rule.interval_unit, rule.interval_count, n) < first:
+            n += 1
+
+    while True:
+        day = nth_occurrence(rule_start, rule.interval_unit, rule.interval_count, n)
+        if day >= last:
+            return
+        yield day.isoformat()
+        n += 1
+
+
+def matches_search(rule, search):
+    """Mirror core.search_query for a rule: every word must be a prefix of a word in description or comment."""
+    words = f"{rule.description} {rule.comment or ''}".casefold().split()
+    return all(any(word.startswith(term) for word in words) for term in search.casefold().split())
+
+
+def fetch_rules(start_date, end_date, category=None, conn=None):
+    """Return the rules that may have occurrences in [start_date, end_date), category None means all."""
+    query = (SELECT_RULES + " WHERE start_date < ? AND (end_date IS NULL OR end_date >= ?)"
+             " AND (materialized_until IS NULL OR materialized_until < ?)")
+    params = [end_date, start_date, end_date]
+    if category:
+        query += " AND category = ?"
+        params.append(category)
+    return [RecurringRule(*row) for row in (conn or get_connection()).execute(query, params)]
+
+
+def iter_occurrences(start_date, end_date, category=None, search=None, conn=None):
+    """Yield the recurring occurrences in [start_date, end_date) as expense rows, ordered by date."""
+    rules = fetch_rules(start_date, end_date, category, conn)
+    if search and search.strip():
+        rules = [rule for rule in rules if matches_search(rule, search)]
+
+    def expand(rule):
+        for day in occurrences(rule, start_date, end_date):
+            yield (rule.description, rule.category, day, rule.amount_cents, rule.comment)
+
+    yield from heapq.merge(*(expand(rule) for rule in rules), key=lambda row: row[2])
+
+
+def list_rules(conn=None):
+    """Return all rules, ordered by start date."""
+    return [RecurringRule(*row) for row in (conn or get_connection()).execute(SELECT_RULES + " ORDER BY start_date, id")]
+
+
+def materialize(until_date, conn=None):
+    """
+    Store all occurrences up to and including until_date (YYYY-MM-DD) as real expenses.
+
+    Each rule remembers how far it was materialized, so occurrences are never stored twice and the
+    query time expansion skips them. Occurrences that were already entered by hand (same date, amount
+    and description) are skipped like duplicates on a CSV import. Returns the number of expenses inserted.
+    """
+    conn = conn or get_connection()
+    end_date = (datetime.date.fromisoformat(until_date) + datetime.timedelta(days=1)).isoformat()
+    inserted = 0
+    unmatched = {}  # fingerprint -> stored expenses not yet matched by an occurrence
+    with conn:
+        for rule in fetch_rules("0001-01-01", end_date, conn=conn):
+            rows = []
+            for day in occurrences(rule, rule.start_date, end_date):
+                fingerprint, stored = find_duplicates(rule.description, day, rule.amount_cents, conn)
+                # Counted once per fingerprint, before occurrences with it are inserted
+                unmatched.setdefault(fingerprint, stored)
+                if unmatched[fingerprint]:
+                    unmatched[fingerprint] -= 1
+                    continue
+                rows.append((rule.description, rule.category, day, rule.amount_cents, rule.comment))
+            conn.executemany(INSERT_EXPENSE, rows)
+            conn.execute("UPDATE recurring_rules SET materialized_until = ? WHERE id = ?", (end_date, rule.id))
+            inserted += len(rows)
+    bump_write_version()
+    return inserted
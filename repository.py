@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from schema import fingerprint_sql, migrate
+from instrumentation import InstrumentedConnection, is_enabled as instrumentation_enabled
+
+DB_PATH = os.path.join('data', 'expenses.db')
+
+# Connection tuning, applied to every connection that is opened
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",  # Readers and the writer don't block each other
+    "PRAGMA synchronous = NORMAL",  # Safe with WAL, avoids an fsync on every commit
+    "PRAGMA cache_size = -16000",  # 16 MB page cache
+    "PRAGMA mmap_size = 268435456",  # Memory-map up to 256 MB of the database file
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Hot statements. They are always executed with the exact same SQL text, so sqlite3 keeps them
+# prepared in the connection's statement cache.
+INSERT_EXPENSE = "INSERT INTO expenses (description, category, date, amount_cents, comment) VALUES (?, ?, ?, ?, ?)"
+# The rollup is far smaller than expenses, recurring rules may use categories without stored expenses
+SELECT_CATEGORIES = "SELECT category FROM expense_monthly_totals UNION SELECT category FROM recurring_rules"
+# Month-to-date spending comes from the monthly rollup, which the insert trigger keeps current,
+# so checking a budget is a primary key lookup in both tables
+SELECT_BUDGET_STATUS = """SELECT budgets.category, budgets.limit_cents, COALESCE(expense_monthly_totals.total_cents, 0)
+    FROM budgets LEFT JOIN expense_monthly_totals
+        ON expense_monthly_totals.month = ? AND expense_monthly_totals.category = budgets.category"""
+INSERT_RECURRING_RULE = """INSERT INTO recurring_rules
+    (description, category, amount_cents, comment, interval_unit, interval_count, start_date, end_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+# Fingerprint of an expense and the number of stored expenses with it, one lookup in the fingerprint index
+SELECT_FINGERPRINT = f"""SELECT fingerprint, (SELECT COUNT(*) FROM expenses WHERE expenses.fingerprint = key.fingerprint)
+    FROM (SELECT {fingerprint_sql("?", "?", "?")} AS fingerprint) AS key"""
+UPSERT_BUDGET = """INSERT INTO budgets (category, limit_cents) VALUES (?, ?)
+    ON CONFLICT (category) DO UPDATE SET limit_cents = excluded.limit_cents"""
+
+STATEMENT_CACHE_SIZE = 256
+
+_connection = None
+
+# Bumped by every write path of this process. PRAGMA data_version only changes for commits made
+# by other connections, so together they tell whether the data may have changed.
+_write_version = 0
+
+
+def connect(path=DB_PATH):
+    """Open a new tuned connection to the database, creating the data directory if needed."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    factory = InstrumentedConnection if instrumentation_enabled() else sqlite3.Connection
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Return the shared application connection, opening and migrating the database on first use."""
+    global _connection
+    if _connection is None:
+        _connection = connect()
+        migrate(_connection)
+    return _connection
+
+
+def close_connection():
+    """Close the shared connection, it is reopened on the next get_connection call."""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def bump_write_version():
+    """Record that this process has written to the database."""
+    global _write_version
+    _write_version += 1
+
+
+def get_data_version():
+    """Return a token that changes whenever the data changes, in this or any other process."""
+    return _write_version, get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+
+def insert_expense(description, category, date, amount_cents, comment):
+    """Insert a single expense, with the amount in integer cents, and commit it."""
+    conn = get_connection()
+    with conn:
+        conn.execute(INSERT_EXPENSE, (description, category, date, amount_cents, comment))
+    bump_write_version()
+
+
+def find_duplicates(description, date, amount_cents, conn=None):
+    """Return the fingerprint of an expense and how many stored expenses share it."""
+    return (conn or get_connection()).execute(SELECT_FINGERPRINT, (date, amount_cents, description)).fetchone()
+
+
+def delete_expenses(ids):
+    """Delete expenses by id and commit, the triggers keep the rollups and the search index current."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("DELETE FROM expenses WHERE id = ?", [(expense_id,) for expense_id in ids])
+    bump_write_version()
+
+
+def insert_recurring_rule(description, category, amount_cents, comment, interval_unit, interval_count,
+                          start_date, end_date):
+    """Insert a recurring expense rule and commit it."""
+    conn = get_connection()
+    with conn:
+        conn.execute(INSERT_RECURRING_RULE, (description, category, amount_cents, comment, interval_unit,
+                                             interval_count, start_date, end_date))
+    bump_write_version()
+
+
+def delete_recurring_rule(rule_id):
+    """Delete a recurring expense rule, occurrences that were materialized stay in expenses."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM recurring_rules WHERE id = ?", (rule_id,))
+    bump_write_version()
+
+
+def upsert_budget(category, limit_cents):
+    """Set the monthly budget of a category, in integer cents."""
+    conn = get_connection()
+    with conn:
+        conn.execute(UPSERT_BUDGET, (category, limit_cents))
+
+
+def delete_budget(category):
+    """Remove the monthly budget of a category."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM budgets WHERE category = ?", (category,))
+
+
+def fetch_categories():
+    """Return all categories that have expenses."""
+    return [row[0] for row in get_connection().execute(SELECT_CATEGORIES)]
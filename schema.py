@@ -0,0 +1,262 @@
+import sqlite3
+import sys
+
+
+# Column names of the rollup schema. Migration 3 created it for REAL amounts, migration 5
+# recreates it for integer cents.
+REAL_ROLLUP_COLUMNS = {"amount": "amount", "total": "total", "low": "min_amount", "high": "max_amount",
+                       "type": "REAL"}
+CENTS_ROLLUP_COLUMNS = {"amount": "amount_cents", "total": "total_cents", "low": "min_cents", "high": "max_cents",
+                        "type": "INTEGER"}
+
+
+def _refresh_rollup_sql(row, c):
+    """SQL that recomputes the daily and monthly rollup buckets of an OLD/NEW expense row from the raw rows."""
+    return f"""
+        DELETE FROM expense_daily_totals WHERE day = {row}.date AND category = {row}.category;
+        INSERT INTO expense_daily_totals (day, category, {c['total']}, count, {c['low']}, {c['high']})
+            SELECT date, category, SUM({c['amount']}), COUNT(*), MIN({c['amount']}), MAX({c['amount']}) FROM expenses
+            WHERE date = {row}.date AND category = {row}.category
+            GROUP BY date, category;
+        DELETE FROM expense_monthly_totals WHERE month = substr({row}.date, 1, 7) AND category = {row}.category;
+        INSERT INTO expense_monthly_totals (month, category, {c['total']}, count, {c['low']}, {c['high']})
+            SELECT substr(date, 1, 7), category, SUM({c['amount']}), COUNT(*), MIN({c['amount']}), MAX({c['amount']})
+            FROM expenses
+            -- The range lets the (category, date) index narrow the scan to one month
+            WHERE category = {row}.category
+              AND date >= substr({row}.date, 1, 7) AND date < substr({row}.date, 1, 7) || '~'
+              AND substr(date, 1, 7) = substr({row}.date, 1, 7)
+            GROUP BY substr(date, 1, 7), category;
+    """
+
+
+def _rebuild_rollups_sql(c):
+    return f"""
+    DELETE FROM expense_daily_totals;
+    DELETE FROM expense_monthly_totals;
+    INSERT INTO expense_daily_totals (day, category, {c['total']}, count, {c['low']}, {c['high']})
+        SELECT date, category, SUM({c['amount']}), COUNT(*), MIN({c['amount']}), MAX({c['amount']}) FROM expenses
+        GROUP BY date, category;
+    INSERT INTO expense_monthly_totals (month, category, {c['total']}, count, {c['low']}, {c['high']})
+        SELECT substr(day, 1, 7), category, SUM({c['total']}), SUM(count), MIN({c['low']}), MAX({c['high']})
+        FROM expense_daily_totals
+        GROUP BY substr(day, 1, 7), category;
+    """
+
+
+def _rollup_schema_sql(c):
+    """Rollup tables, the triggers that keep them current and their initial fill."""
+    return f"""
+    CREATE TABLE IF NOT EXISTS expense_daily_totals (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        {c['total']} {c['type']} NOT NULL,
+        count INTEGER NOT NULL,
+        {c['low']} {c['type']} NOT NULL,
+        {c['high']} {c['type']} NOT NULL,
+        PRIMARY KEY (day, category)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS expense_monthly_totals (
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        {c['total']} {c['type']} NOT NULL,
+        count INTEGER NOT NULL,
+        {c['low']} {c['type']} NOT NULL,
+        {c['high']} {c['type']} NOT NULL,
+        PRIMARY KEY (month, category)
+    ) WITHOUT ROWID;
+
+    -- Inserts only add to their bucket
+    CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expense_daily_totals (day, category, {c['total']}, count, {c['low']}, {c['high']})
+            VALUES (NEW.date, NEW.category, NEW.{c['amount']}, 1, NEW.{c['amount']}, NEW.{c['amount']})
+            ON CONFLICT (day, category) DO UPDATE SET
+                {c['total']} = {c['total']} + excluded.{c['total']}, count = count + 1,
+                {c['low']} = MIN({c['low']}, excluded.{c['low']}), {c['high']} = MAX({c['high']}, excluded.{c['high']});
+        INSERT INTO expense_monthly_totals (month, category, {c['total']}, count, {c['low']}, {c['high']})
+            VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.{c['amount']}, 1, NEW.{c['amount']}, NEW.{c['amount']})
+            ON CONFLICT (month, category) DO UPDATE SET
+                {c['total']} = {c['total']} + excluded.{c['total']}, count = count + 1,
+                {c['low']} = MIN({c['low']}, excluded.{c['low']}), {c['high']} = MAX({c['high']}, excluded.{c['high']});
+    END;
+
+    -- Deletes and updates recompute the touched buckets, which keeps min/max exact
+    CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses BEGIN
+        {_refresh_rollup_sql("OLD", c)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF date, category, {c['amount']} ON expenses BEGIN
+        {_refresh_rollup_sql("OLD", c)}
+        {_refresh_rollup_sql("NEW", c)}
+    END;
+
+    {_rebuild_rollups_sql(c)}
+    """
+
+
+REBUILD_ROLLUPS_SQL = _rebuild_rollups_sql(CENTS_ROLLUP_COLUMNS)
+
+FTS_TRIGGERS_SQL = """
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, description, comment) VALUES (NEW.id, NEW.description, NEW.comment);
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description, comment)
+            VALUES ('delete', OLD.id, OLD.description, OLD.comment);
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description, comment ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description, comment)
+            VALUES ('delete', OLD.id, OLD.description, OLD.comment);
+        INSERT INTO expenses_fts (rowid, description, comment) VALUES (NEW.id, NEW.description, NEW.comment);
+    END;
+"""
+
+def fingerprint_sql(date, amount_cents, description):
+    """
+    SQL expression of the duplicate detection key: date, amount and the normalized description.
+
+    The description is trimmed, lowercased (lower() only folds ASCII) and runs of up to 16 spaces
+    or tabs are collapsed. Used for the generated column and, with ? placeholders, for lookups.
+    """
+    normalized = f"replace({description}, char(9), ' ')"
+    for _ in range(4):
+        normalized = f"replace({normalized}, '  ', ' ')"
+    return f"{date} || '|' || {amount_cents} || '|' || lower(trim({normalized}))"
+
+
+# Versioned schema migrations. The index in this list + 1 is the schema version
+# stored in PRAGMA user_version after the migration has been applied.
+MIGRATIONS = [
+    # 1: Base expenses table
+    """
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount REAL NOT NULL,
+        comment TEXT
+    );
+    """,
+    # 2: Composite indexes for the date range and category filters
+    """
+    CREATE INDEX IF NOT EXISTS idx_expenses_date_category ON expenses (date, category);
+    CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date);
+    """,
+    # 3: Daily and monthly rollups kept current by triggers
+    _rollup_schema_sql(REAL_ROLLUP_COLUMNS),
+    # 4: Full-text search over description and comment, kept in sync by triggers
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+        description, comment,
+        content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+
+    {FTS_TRIGGERS_SQL}
+
+    -- Backfill the index from existing rows
+    INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild');
+    """,
+    # 5: Amounts as exact integer cents instead of REAL. The table is rebuilt with the same ids,
+    # which drops its indexes and triggers, so they are created again.
+    f"""
+    DROP TABLE IF EXISTS expense_daily_totals;
+    DROP TABLE IF EXISTS expense_monthly_totals;
+
+    CREATE TABLE expenses_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        comment TEXT
+    );
+    INSERT INTO expenses_new (id, description, category, date, amount_cents, comment)
+        SELECT id, description, category, date, CAST(ROUND(amount * 100) AS INTEGER), comment FROM expenses;
+    DROP TABLE expenses;
+    ALTER TABLE expenses_new RENAME TO expenses;
+
+    CREATE INDEX idx_expenses_date_category ON expenses (date, category);
+    CREATE INDEX idx_expenses_category_date ON expenses (category, date);
+    {FTS_TRIGGERS_SQL}
+    {_rollup_schema_sql(CENTS_ROLLUP_COLUMNS)}
+    """,
+    # 6: Monthly budgets per category, checked against expense_monthly_totals
+    """
+    CREATE TABLE IF NOT EXISTS budgets (
+        category TEXT PRIMARY KEY,
+        limit_cents INTEGER NOT NULL CHECK (limit_cents >= 0)
+    ) WITHOUT ROWID;
+    """,
+    # 7: Recurring expense rules, expanded into occurrences at query time
+    """
+    CREATE TABLE IF NOT EXISTS recurring_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        category TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        comment TEXT,
+        interval_unit TEXT NOT NULL CHECK (interval_unit IN ('day', 'week', 'month', 'year')),
+        interval_count INTEGER NOT NULL DEFAULT 1 CHECK (interval_count >= 1),
+        start_date TEXT NOT NULL,
+        end_date TEXT,  -- Last possible occurrence, NULL repeats forever
+        materialized_until TEXT  -- Occurrences before this date are stored in expenses
+    );
+    """,
+    # 8: Fingerprint for duplicate detection. A virtual generated column takes no space in the
+    # table and can't go stale, only the index stores it.
+    f"""
+    ALTER TABLE expenses ADD COLUMN fingerprint TEXT
+        GENERATED ALWAYS AS ({fingerprint_sql("date", "amount_cents", "description")}) VIRTUAL;
+    CREATE INDEX IF NOT EXISTS idx_expenses_fingerprint ON expenses (fingerprint);
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    """Return the schema version stored in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply all pending migrations, each one in its own transaction."""
+    version = get_schema_version(conn)
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def rebuild_search_index(conn):
+    """Rebuild the full-text search index from the expenses table."""
+    conn.executescript("BEGIN;\nINSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild');\nCOMMIT;")
+
+
+def rebuild_rollups(conn):
+    """Recompute the daily and monthly rollup tables from the expenses table."""
+    conn.executescript(f"BEGIN;\n{REBUILD_ROLLUPS_SQL}\nCOMMIT;")
+
+
+REBUILD_COMMANDS = {
+    "rebuild-rollups": (rebuild_rollups, "Rollup tables rebuilt."),
+    "rebuild-search": (rebuild_search_index, "Search index rebuilt."),
+}
+
+
+if __name__ == "__main__":
+    # Usage: python schema.py rebuild-rollups|rebuild-search [path/to/expenses.db]
+    if len(sys.argv) < 2 or sys.argv[1] not in REBUILD_COMMANDS:
+        sys.exit("Usage: python schema.py rebuild-rollups|rebuild-search [database]")
+
+    rebuild, message = REBUILD_COMMANDS[sys.argv[1]]
+    conn = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else 'data/expenses.db')
+    migrate(conn)
+    rebuild(conn)
+    conn.close()
+    print(message)
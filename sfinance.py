@@ -1,26 +1,21 @@
 import sys
 import os
-import sqlite3
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QDateEdit, QTextEdit, QMessageBox, QApplication)
-from PyQt6.QtCore import QDate
-from PyQt6.QtGui import QPalette, QColor, QIcon, QDoubleValidator
 
-# Ensure the data directory exists
-if not os.path.exists('data'):
-    os.makedirs('data')
-
-# Database setup
-conn = sqlite3.connect('data/expenses.db')
-cursor = conn.cursor()
-cursor.execute('''CREATE TABLE IF NOT EXISTS expenses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    description TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    comment TEXT
-                )''')
-conn.commit()
+# "python -m sfinance <command>" runs the command line interface without loading Qt
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from cli import main
+    sys.exit(main())
+
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QDateEdit, QTextEdit, QMessageBox, QApplication,
+                             QDialog, QTableWidget, QTableWidgetItem, QCompleter)
+from PyQt6.QtCore import QDate, QStringListModel
+from PyQt6.QtGui import QPalette, QColor, QIcon, QDoubleValidator
+from styles import APP_STYLESHEET
+from core import DuplicateExpenseError, add_expense, add_recurring_expense, budget_warning, format_cents, parse_amount
+from recurring import list_rules, materialize
+from repository import connect, delete_recurring_rule, get_data_version
+from suggestions import build_index
+from workers import Worker
 
 # Funktion, um den Pfad zu Ressourcen zu finden, unabhängig davon, ob das Programm als Skript oder EXE ausgeführt wird
 def resource_path(relative_path):
@@ -33,8 +28,87 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+class SuggestionWorker(Worker):
+    """Builds the description suggestion index on a thread pool thread with its own connection."""
+
+    def work(self):
+        conn = connect()
+        try:
+            return build_index(conn)
+        finally:
+            conn.close()
+
+class RecurringRulesDialog(QDialog):
+    """Lists the recurring expenses, removes them and stores their occurrences as regular expenses."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("sFinance - Recurring Expenses")
+        self.resize(700, 400)
+
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor(50, 50, 50))  # Dark gray
+        self.setPalette(palette)
+
+        layout = QVBoxLayout()
+
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(["Description", "Category", "Amount (€)", "Repeats", "From", "Until"])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+
+        self.remove_button = QPushButton("Remove Selected")
+        self.remove_button.clicked.connect(self.remove_rule)
+        layout.addWidget(self.remove_button)
+
+        # Occurrences are only computed when queried, this stores them as real expenses instead
+        layout.addWidget(QLabel("Store occurrences as expenses up to:"))
+        self.until_input = QLineEdit(self)
+        self.until_input.setPlaceholderText("YYYY-MM-DD")
+        self.until_input.setText(QDate.currentDate().toString("yyyy-MM-dd"))
+        layout.addWidget(self.until_input)
+
+        self.materialize_button = QPushButton("Store Occurrences")
+        self.materialize_button.clicked.connect(self.materialize_rules)
+        layout.addWidget(self.materialize_button)
+
+        self.setLayout(layout)
+        self.load_rules()
+
+    def load_rules(self):
+        self.rules = list_rules()
+        self.table.setRowCount(len(self.rules))
+        for row_idx, rule in enumerate(self.rules):
+            repeats = (f"every {rule.interval_count} {rule.interval_unit}s" if rule.interval_count > 1
+                       else f"every {rule.interval_unit}")
+            values = [rule.description, rule.category, format_cents(rule.amount_cents), repeats, rule.start_date,
+                      rule.end_date or ""]
+            for col_idx, value in enumerate(values):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+    def remove_rule(self):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        delete_recurring_rule(self.rules[row].id)
+        self.load_rules()
+
+    def materialize_rules(self):
+        until = QDate.fromString(self.until_input.text(), "yyyy-MM-dd")
+        if not until.isValid():
+            QMessageBox.warning(self, "Error", "Please enter a valid date (YYYY-MM-DD).")
+            return
+        count = materialize(until.toString("yyyy-MM-dd"))
+        QMessageBox.information(self, "Success", f"Stored {count} recurring expenses.")
+
 # Main App class
 class SFinanceApp(QWidget):
+    # Repeat option -> recurring interval unit, None adds a single expense
+    REPEAT_OPTIONS = {"Never": None, "Daily": "day", "Weekly": "week", "Monthly": "month", "Yearly": "year"}
+
     def __init__(self, main_window):
         super().__init__()
 
@@ -58,6 +132,18 @@ class SFinanceApp(QWidget):
         self.description_label = QLabel("Expense Description:")
         self.description_input = QLineEdit(self)
         self.description_input.setPlaceholderText("Enter description")
+        self.description_input.textEdited.connect(self.update_suggestions)
+        self.description_input.editingFinished.connect(self.prefill_known_description)
+
+        # Autocomplete from past descriptions, ranked by the index instead of the completer
+        self.suggestion_index = None
+        self.suggestion_version = None
+        self.suggestion_worker = None
+        self.suggestion_model = QStringListModel(self)
+        self.completer = QCompleter(self.suggestion_model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setWidget(self.description_input)
+        self.completer.activated.connect(self.apply_suggestion)
         
         self.category_label = QLabel("Category:")
         self.category_input = QComboBox(self)
@@ -74,6 +160,16 @@ class SFinanceApp(QWidget):
         self.amount_input.setPlaceholderText("Enter amount")
         self.amount_input.setValidator(QDoubleValidator(0.00, 1000000.00, 2, self))  # Allows decimals up to two decimal places
 
+        # Rent, subscriptions, ... are stored once as a recurring rule
+        self.repeat_label = QLabel("Repeat:")
+        self.repeat_input = QComboBox(self)
+        self.repeat_input.addItems(self.REPEAT_OPTIONS)
+        self.repeat_input.currentTextChanged.connect(self.update_repeat_ui)
+
+        self.end_date_label = QLabel("Repeat Until (Optional):")
+        self.end_date_input = QLineEdit(self)
+        self.end_date_input.setPlaceholderText("YYYY-MM-DD")
+
         self.comment_label = QLabel("Comment (Optional):")
         self.comment_input = QTextEdit(self)
         self.comment_input.setPlaceholderText("Enter additional notes")
@@ -81,6 +177,9 @@ class SFinanceApp(QWidget):
         self.submit_button = QPushButton("Add Expense")
         self.submit_button.clicked.connect(self.add_expense)
 
+        self.recurring_button = QPushButton("Recurring Expenses")
+        self.recurring_button.clicked.connect(self.show_recurring_rules)
+
         self.back_button = QPushButton("Back")
         self.back_button.clicked.connect(self.go_back_to_main)
 
@@ -92,68 +191,147 @@ class SFinanceApp(QWidget):
         layout.addWidget(self.date_input)
         layout.addWidget(self.amount_label)
         layout.addWidget(self.amount_input)
+        layout.addWidget(self.repeat_label)
+        layout.addWidget(self.repeat_input)
+        layout.addWidget(self.end_date_label)
+        layout.addWidget(self.end_date_input)
         layout.addWidget(self.comment_label)
         layout.addWidget(self.comment_input)
         layout.addWidget(self.submit_button)
+        layout.addWidget(self.recurring_button)
         layout.addWidget(self.back_button)
 
         self.setLayout(layout)
+        self.update_repeat_ui()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_suggestions()
+
+    def refresh_suggestions(self):
+        """Rebuild the suggestion index in the background if the data changed since it was built."""
+        version = get_data_version()
+        if self.suggestion_worker is not None or version == self.suggestion_version:
+            return
+        self.suggestion_version = version
+        self.suggestion_worker = worker = SuggestionWorker()
+        worker.signals.finished.connect(self.on_suggestions_ready)
+        worker.signals.failed.connect(self.on_suggestions_failed)
+        worker.signals.done.connect(self.on_suggestions_done)
+        worker.start()
+
+    def on_suggestions_done(self):
+        self.suggestion_worker = None
+
+    def on_suggestions_failed(self, message):
+        # E.g. the database was locked by a restore, the next showEvent tries again
+        self.suggestion_version = None
+
+    def on_suggestions_ready(self, index):
+        self.suggestion_index = index
+        # Categories from the history, not only the built-in ones
+        known = {self.category_input.itemText(i) for i in range(self.category_input.count())}
+        self.category_input.addItems(sorted(index.categories() - known))
+
+    def update_suggestions(self, text):
+        if self.suggestion_index is None:
+            return
+        matches = self.suggestion_index.complete(text)
+        self.suggestion_model.setStringList(matches)
+        if matches and matches != [text]:
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    def apply_suggestion(self, description):
+        self.description_input.setText(description)
+        self.prefill(description)
+
+    def prefill_known_description(self):
+        # A known description typed out without the popup, unless the amount was already entered
+        if not self.amount_input.text():
+            self.prefill(self.description_input.text())
 
-        # Apply stylesheet
-        self.setStyleSheet("""
-            QWidget {
-                font-size: 16px;
-                color: white;
-            }
-            QLineEdit, QComboBox, QTextEdit {
-                background-color: #f5f5f5;
-                border-radius: 10px;
-                padding: 8px;
-                color: black;
-            }
-            QPushButton {
-                background-color: #007AFF;
-                color: white;
-                border-radius: 10px;
-                padding: 10px;
-            }
-            QPushButton:hover {
-                background-color: #005BBB;
-            }
-            QMessageBox {
-                background-color: #353B3C;
-                color: black;
-            }
-        """)
+    def prefill(self, description):
+        """Fill in the category and amount most likely for a known description."""
+        prediction = self.suggestion_index.predict(description) if self.suggestion_index else None
+        if prediction is None:
+            return
+        category, amount_cents = prediction
+        if self.category_input.findText(category) < 0:
+            self.category_input.addItem(category)
+        self.category_input.setCurrentText(category)
+        self.amount_input.setText(format_cents(amount_cents))
+
+    def update_repeat_ui(self):
+        """Only show the end date for recurring expenses."""
+        recurring = self.REPEAT_OPTIONS[self.repeat_input.currentText()] is not None
+        self.end_date_label.setVisible(recurring)
+        self.end_date_input.setVisible(recurring)
 
     def add_expense(self):
         description = self.description_input.text()
         category = self.category_input.currentText()
         date = self.date_input.text()
 
-        # Replace comma with a dot to handle both , and . as decimal separators
-        amount = self.amount_input.text().replace(',', '.')
-
+        amount = self.amount_input.text()
         comment = self.comment_input.toPlainText()
 
-        if description and amount:
+        interval_unit = self.REPEAT_OPTIONS[self.repeat_input.currentText()]
+        if interval_unit is not None:
+            self.add_recurring_expense(description, category, date, amount, interval_unit, comment)
+            return
+
+        try:
             try:
-                amount = float(amount)  # Ensure valid float conversion
-                cursor.execute("INSERT INTO expenses (description, category, date, amount, comment) VALUES (?, ?, ?, ?, ?)", 
-                               (description, category, date, amount, comment))
-                conn.commit()
-                QMessageBox.information(self, "Success", "Expense added successfully!")
-
-                # Clear input fields
-                self.description_input.clear()
-                self.amount_input.clear()
-                self.comment_input.clear()
-                self.date_input.setText(QDate.currentDate().toString("yyyy-MM-dd"))
-
-            except ValueError:
-                QMessageBox.warning(self, "Error", "Please enter a valid amount.")
+                budget_status = add_expense(description, category, date, amount, comment)
+            except DuplicateExpenseError as e:
+                # Usually a double click, but two equal expenses on one day are possible
+                answer = QMessageBox.question(self, "Duplicate Expense", f"{e}\n\nAdd it anyway?")
+                if answer != QMessageBox.StandardButton.Yes:
+                    return
+                budget_status = add_expense(description, category, date, amount, comment, allow_duplicate=True)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        if self.suggestion_index is not None:
+            self.suggestion_index.add(description, category, date, parse_amount(amount))
+            if self.suggestion_worker is None:
+                self.suggestion_version = get_data_version()  # Only our own insert, no rebuild needed
+
+        warning = budget_warning(budget_status)
+        if warning:
+            QMessageBox.warning(self, "Budget Exceeded", f"Expense added successfully!\n\n{warning}")
         else:
-            QMessageBox.warning(self, "Error", "Please fill out all fields.")
+            QMessageBox.information(self, "Success", "Expense added successfully!")
+
+        # Clear input fields
+        self.description_input.clear()
+        self.amount_input.clear()
+        self.comment_input.clear()
+        self.date_input.setText(QDate.currentDate().toString("yyyy-MM-dd"))
+
+    def add_recurring_expense(self, description, category, date, amount, interval_unit, comment):
+        try:
+            add_recurring_expense(description, category, date, amount, interval_unit, 1,
+                                  self.end_date_input.text().strip() or None, comment)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        QMessageBox.information(self, "Success", "Recurring expense added successfully!")
+
+        # Clear input fields
+        self.description_input.clear()
+        self.amount_input.clear()
+        self.comment_input.clear()
+        self.end_date_input.clear()
+        self.repeat_input.setCurrentText("Never")
+        self.date_input.setText(QDate.currentDate().toString("yyyy-MM-dd"))
+
+    def show_recurring_rules(self):
+        RecurringRulesDialog(self).exec()
 
     def go_back_to_main(self):
         self.close()
@@ -161,6 +339,7 @@ class SFinanceApp(QWidget):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.setStyleSheet(APP_STYLESHEET)
     main_window = SFinanceApp(None)  # For standalone testing, pass None for the main window
     main_window.show()
     sys.exit(app.exec())
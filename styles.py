@@ -0,0 +1,42 @@
+# Stylesheet for the whole application. It is set once on the QApplication, so Qt parses it a single
+# time instead of once per window. Rules for the sub windows are scoped by their class names.
+APP_STYLESHEET = """
+    QPushButton {
+        background-color: #007AFF;
+        color: white;
+        border-radius: 10px;
+        padding: 10px;
+    }
+    QPushButton:hover {
+        background-color: #005BBB;
+    }
+
+    SFinanceApp, SFinanceApp QWidget, DataEvaluationApp, DataEvaluationApp QWidget {
+        font-size: 16px;
+        color: white;
+    }
+    SFinanceApp QLineEdit, SFinanceApp QComboBox, SFinanceApp QTextEdit,
+    DataEvaluationApp QLineEdit, DataEvaluationApp QComboBox, DataEvaluationApp QDateEdit, DataEvaluationApp QTextEdit {
+        background-color: #f5f5f5;
+        border-radius: 10px;
+        padding: 8px;
+        color: black;  /* Black text for input fields */
+    }
+    SFinanceApp QMessageBox, DataEvaluationApp QMessageBox {
+        background-color: #353B3C;
+        color: black;
+    }
+
+    DataEvaluationApp QComboBox QAbstractItemView {
+        background-color: white;
+        color: black;  /* Black text in dropdown menu */
+    }
+    SFinanceApp QTableView, DataEvaluationApp QTableView {
+        background-color: white;
+        color: black;  /* Black text in table */
+    }
+    SFinanceApp QTableView QHeaderView::section, DataEvaluationApp QTableView QHeaderView::section {
+        background-color: #007AFF;
+        color: white;  /* Header in blue with white text */
+    }
+"""
@@ -0,0 +1,160 @@
+"""
+Description suggestions for the add expense form, from an in-memory prefix index of past expenses.
+
+The index holds one entry per distinct description (compared case-insensitively) with how often and
+how recently it was used, and per category the last amount. Lookups are a binary search in the sorted
+descriptions, so they don't depend on the number of stored expenses. Must not import Qt.
+"""
+import bisect
+import datetime
+import heapq
+from repository import get_connection
+
+# The latest row of each group supplies amount_cents, SQLite takes bare columns from the MAX(date) row
+SELECT_DESCRIPTION_STATS = """SELECT description, category, COUNT(*), MAX(date), amount_cents
+    FROM expenses GROUP BY description, category
+    UNION ALL SELECT description, category, 1, start_date, amount_cents FROM recurring_rules"""
+
+MAX_SUGGESTIONS = 10
+RECENCY_HALF_LIFE_DAYS = 90  # A description not used for 90 days counts half
+SCAN_LIMIT = 1000  # Prefixes matching more descriptions are ranked when the index is built
+
+
+class DescriptionEntry:
+    __slots__ = ("description", "count", "last_date", "score", "categories")
+
+    def __init__(self, description):
+        self.description = description
+        self.count = 0
+        self.last_date = ""
+        self.score = 0.0
+        self.categories = {}  # category -> [count, last date, last amount in cents]
+
+
+class SuggestionIndex:
+    """
+    Ranks past descriptions for a typed prefix by frequency and recency and predicts category and amount.
+
+    Build it with build_index (off the GUI thread for large databases) and keep it current with add
+    after every insert. It is not thread safe, use it from one thread once it is built.
+    """
+
+    def __init__(self, today=None):
+        self.today = today or datetime.date.today()
+        self._entries = {}  # casefolded description -> DescriptionEntry
+        self._keys = []  # Sorted casefolded descriptions
+        self._top = {}  # Cached rankings of prefixes matching more than SCAN_LIMIT descriptions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _score(self, entry):
+        try:
+            age = (self.today - datetime.date.fromisoformat(entry.last_date)).days
+        except ValueError:
+            age = 0
+        return entry.count * 0.5 ** (max(age, 0) / RECENCY_HALF_LIFE_DAYS)
+
+    def _record(self, description, category, count, date, amount_cents):
+        key = description.strip().casefold()
+        if not key:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = DescriptionEntry(description.strip())
+        entry.count += count
+        if date >= entry.last_date:
+            entry.last_date = date
+            entry.description = description.strip()  # The latest spelling is shown
+
+        stats = entry.categories.get(category)
+        if stats is None:
+            entry.categories[category] = [count, date, amount_cents]
+        else:
+            stats[0] += count
+            if date >= stats[1]:
+                stats[1], stats[2] = date, amount_cents
+        return key
+
+    def load(self, rows):
+        """Fill the index from (description, category, count, last date, last amount) rows."""
+        for row in rows:
+            self._record(*row)
+        for entry in self._entries.values():
+            entry.score = self._score(entry)
+        self._keys = sorted(self._entries)
+        self._top.clear()
+        self._cache_rankings("", 0, len(self._keys))
+
+    def _cache_rankings(self, prefix, start, end):
+        """Rank all prefixes matching more than SCAN_LIMIT descriptions up front, so no lookup has to."""
+        if end - start <= SCAN_LIMIT:
+            return
+        if prefix:
+            self._top[prefix] = self._rank(start, end, MAX_SUGGESTIONS)
+        position = start
+        while position < end:
+            key = self._keys[position]
+            if len(key) == len(prefix):
+                position += 1
+                continue
+            child = key[:len(prefix) + 1]
+            child_end = bisect.bisect_left(self._keys, child + "\U0010ffff", position, end)
+            self._cache_rankings(child, position, child_end)
+            position = child_end
+
+    def add(self, description, category, date, amount_cents):
+        """Record a newly inserted expense."""
+        is_new = description.strip().casefold() not in self._entries
+        key = self._record(description, category, 1, date, amount_cents)
+        if key is None:
+            return
+        self._entries[key].score = self._score(self._entries[key])
+        if is_new:
+            bisect.insort(self._keys, key)
+        # Only this description's score went up, so it can only move up in its prefixes' rankings
+        entries = self._entries
+        for end in range(1, len(key) + 1):
+            ranked = self._top.get(key[:end])
+            if ranked is None:
+                continue
+            if key in ranked:
+                ranked.remove(key)
+            ranked.append(key)
+            ranked.sort(key=lambda other: entries[other].score, reverse=True)
+            del ranked[MAX_SUGGESTIONS:]
+
+    def complete(self, prefix, limit=MAX_SUGGESTIONS):
+        """Return up to limit past descriptions starting with prefix (case-insensitive), best first."""
+        prefix = prefix.lstrip().casefold()
+        if not prefix:
+            return []
+        ranked = self._top.get(prefix) if limit <= MAX_SUGGESTIONS else None
+        if ranked is None:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + "\U0010ffff", start)
+            ranked = self._rank(start, end, limit)
+        return [self._entries[key].description for key in ranked[:limit]]
+
+    def _rank(self, start, end, limit):
+        entries = self._entries
+        return heapq.nlargest(limit, self._keys[start:end], key=lambda key: entries[key].score)
+
+    def predict(self, description):
+        """Return (category, amount in cents) most likely for a known description, None for a new one."""
+        entry = self._entries.get(description.strip().casefold())
+        if entry is None:
+            return None
+        category, (_, _, amount_cents) = max(entry.categories.items(), key=lambda item: (item[1][0], item[1][1]))
+        return category, amount_cents
+
+    def categories(self):
+        """Return all categories used so far."""
+        return {category for entry in self._entries.values() for category in entry.categories}
+
+
+def build_index(conn=None, today=None):
+    """Build a SuggestionIndex from the stored expenses and recurring rules."""
+    index = SuggestionIndex(today)
+    index.load((conn or get_connection()).execute(SELECT_DESCRIPTION_STATS))
+    return index
@@ -0,0 +1,59 @@
+"""Background work on the global thread pool with results and errors reported through Qt signals."""
+import threading
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object)  # The result of work()
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(int)  # Only sent by workers that report progress
+    done = pyqtSignal()  # Always sent last, also after a cancel
+
+
+class Worker(QRunnable):
+    """
+    Runs work() on a thread pool thread and reports the result through finished, any exception through failed.
+
+    An exception escaping a QRunnable would abort the whole application. A started worker holds its own
+    reference until done has been delivered, so the signals object outlives the thread pool run without
+    the caller keeping it. After cancel() neither finished nor failed is sent.
+    """
+
+    _running = set()
+
+    def __init__(self, signals=None):
+        super().__init__()
+        self.signals = signals or WorkerSignals()
+        self._cancelled = threading.Event()
+        # Python owns the worker, _release frees it, instead of the pool deleting it right after run()
+        self.setAutoDelete(False)
+
+    def work(self):
+        raise NotImplementedError
+
+    def start(self, pool=None):
+        """Start the worker, after its signals are connected, and return it."""
+        Worker._running.add(self)
+        self.signals.done.connect(self._release)
+        (pool or QThreadPool.globalInstance()).start(self)
+        return self
+
+    def _release(self):
+        Worker._running.discard(self)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            result = self.work()
+            if not self.is_cancelled():
+                self.signals.finished.emit(result)
+        except Exception as e:
+            if not self.is_cancelled():
+                self.signals.failed.emit(str(e))
+        finally:
+            self.signals.done.emit()